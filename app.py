@@ -11,9 +11,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
+import atexit
+import os
 import time
+import uuid
+from streamlit.logger import get_logger
+
+from assets import picture_html, MAIN_HEIGHT, SUB_HEIGHT
+from events import EventLog
+from instrumentation import Profiler
+from model import (
+    load_scores, rank_neighbourhoods, fit_label, get_match_analysis,
+    build_similar_lookup, similar_neighbourhoods, has_coordinates, GeoIndex, dimensions,
+)
 
-from model import load_scores, rank_neighbourhoods, fit_label, get_match_analysis, DIMENSIONS
+LOGGER = get_logger(__name__)
 
 # ── Page setup ─────────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -269,6 +281,16 @@ NBHD_COORDS = {
     "Horta-Guinardó": (41.4196, 2.1623),
 }
 
+# This listing is in El Born (Sant Pere, Santa Caterina i la Ribera)
+LISTING_NEIGHBOURHOOD = "Sant Pere, Santa Caterina i la Ribera"
+
+# Distance-from-listing modes → (distance_weight, radius_km) for rank_neighbourhoods
+PROXIMITY_MODES = {
+    "Doesn't matter": (0.0, None),
+    "Prefer nearby":  (0.35, None),
+    "Within 3 km":    (0.0, 3.0),
+}
+
 DIM_LABELS = {
     "Nightlife & Bars":    "Nightlife",
     "Peaceful & Quiet":    "Peace & quiet",
@@ -280,49 +302,182 @@ DIM_LABELS = {
     "Family-Friendly":     "Family-friendly",
 }
 
+# ── Instrumentation ────────────────────────────────────────────────────────────
+# One profiler per server process: spans from every session aggregate into
+# metrics/app.json, rewritten at most every APP_METRICS_INTERVAL seconds.
+# Set VIBE_PROFILE_SPAN=rank (or analysis, render, load, slowest) to cProfile a span.
+APP_METRICS_INTERVAL = 30
+
+@st.cache_resource
+def get_profiler():
+    profiler = Profiler("app", profile=os.environ.get("VIBE_PROFILE_SPAN"), cpu_clock=time.thread_time)
+    atexit.register(profiler.write)
+    return profiler
+
 # ── Load data ──────────────────────────────────────────────────────────────────
 @st.cache_data
 def get_scores():
     return load_scores("neighbourhood_scores.csv")
 
-scores_df = get_scores()
+@st.cache_data
+def get_similar_lookup():
+    return build_similar_lookup(get_scores())
+
+@st.cache_resource
+def get_geo_index():
+    return GeoIndex.from_scores(get_scores())
+
+with get_profiler().span("load") as load_span:
+    scores_df = get_scores()
+    # Dimensions come from the score artifact, so a column added with features.py shows up here.
+    # Display order is the curated DIM_LABELS order, then artifact-only dimensions in
+    # CSV order — not the CSV column order, which differs between artifacts.
+    DIMENSIONS = sorted(
+        dimensions(scores_df.columns),
+        key=lambda d: list(DIM_LABELS).index(d) if d in DIM_LABELS else len(DIM_LABELS),
+    )
+    similar_lookup = get_similar_lookup()
+    geo_index = get_geo_index() if has_coordinates(scores_df) else None
+    load_span.rows = len(scores_df)
 
 # ── Radar chart ────────────────────────────────────────────────────────────────
-def make_radar(user_prefs, nbhd_row):
-    labels  = list(DIM_LABELS.values())
-    user_v  = [user_prefs[d] * 20 for d in DIMENSIONS]
-    nbhd_v  = [float(nbhd_row[d]) for d in DIMENSIONS]
-
-    fig = go.Figure()
-    fig.add_trace(go.Scatterpolar(
-        r=nbhd_v + [nbhd_v[0]], theta=labels + [labels[0]],
-        fill="toself", fillcolor="rgba(255,56,92,0.10)",
-        line=dict(color="#FF385C", width=2),
-        name="Neighbourhood profile",
-    ))
-    fig.add_trace(go.Scatterpolar(
-        r=user_v + [user_v[0]], theta=labels + [labels[0]],
-        fill="toself", fillcolor="rgba(0,166,153,0.08)",
-        line=dict(color="#00A699", width=2, dash="dot"),
-        name="Your priorities",
-    ))
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True, range=[0, 100],
-                gridcolor="#EBEBEB", tickfont=dict(size=9, color="#AAAAAA"),
-            ),
-            angularaxis=dict(tickfont=dict(size=10, color="#444444")),
-            bgcolor="white",
+# Figures are cached across sessions keyed by (neighbourhood, preference tuple).
+# st.plotly_chart re-validates plain dict specs through go.Figure (~10 ms), so the
+# cache holds the built figure; a hit only pays Streamlit's to_json (<1 ms).
+RADAR_CACHE_SIZE = 512
+
+RADAR_LAYOUT = dict(
+    polar=dict(
+        radialaxis=dict(
+            visible=True, range=[0, 100],
+            gridcolor="#EBEBEB", tickfont=dict(size=9, color="#AAAAAA"),
         ),
-        showlegend=True,
-        legend=dict(orientation="h", y=-0.18, font=dict(size=10, family="Nunito Sans")),
-        height=360,
-        margin=dict(t=20, b=55, l=50, r=50),
-        paper_bgcolor="white",
-        font=dict(family="Nunito Sans"),
-    )
-    return fig
+        angularaxis=dict(tickfont=dict(size=10, color="#444444")),
+        bgcolor="white",
+    ),
+    showlegend=True,
+    legend=dict(orientation="h", y=-0.18, font=dict(size=10, family="Nunito Sans")),
+    height=360,
+    margin=dict(t=20, b=55, l=50, r=50),
+    paper_bgcolor="white",
+    font=dict(family="Nunito Sans"),
+)
+RADAR_NBHD_TRACE = dict(
+    type="scatterpolar", fill="toself", fillcolor="rgba(255,56,92,0.10)",
+    line=dict(color="#FF385C", width=2), name="Neighbourhood profile",
+)
+RADAR_USER_TRACE = dict(
+    type="scatterpolar", fill="toself", fillcolor="rgba(0,166,153,0.08)",
+    line=dict(color="#00A699", width=2, dash="dot"), name="Your priorities",
+)
+
+@st.cache_resource(max_entries=RADAR_CACHE_SIZE)
+def make_radar(nbhd, prefs):
+    # Closed polygons: repeat the first point at the end
+    labels = [DIM_LABELS.get(d, d) for d in DIMENSIONS]
+    user_v = [p * 20 for p in prefs]
+    nbhd_v = [float(v) for v in scores_df.loc[scores_df["neighbourhood"] == nbhd, DIMENSIONS].iloc[0]]
+    theta  = labels + labels[:1]
+    return go.Figure({
+        "data": [
+            {**RADAR_NBHD_TRACE, "r": nbhd_v + nbhd_v[:1], "theta": theta},
+            {**RADAR_USER_TRACE, "r": user_v + user_v[:1], "theta": theta},
+        ],
+        "layout": RADAR_LAYOUT,
+    })
+
+# ── Ranking list ───────────────────────────────────────────────────────────────
+@st.cache_data
+def description_snippets():
+    return {name: info[0][:68] + "..." for name, info in NBHD_INFO.items()}
+
+THIS_LISTING_TAG = (
+    "&nbsp;<span style='background:#FF385C;color:white;font-size:0.65rem;"
+    "font-weight:700;padding:2px 7px;border-radius:8px;vertical-align:middle;"
+    "'>This listing</span>"
+)
+UNCERTAIN_TAG = (
+    "&nbsp;<span style='background:#F7F7F7;color:#717171;font-size:0.65rem;"
+    "font-weight:700;padding:2px 7px;border-radius:8px;vertical-align:middle;"
+    "' title='Few reviews behind some of these scores'>Uncertain</span>"
+)
+
+def ranking_list_html(ranked):
+    """
+    HTML for the whole comparison list, built column-wise from the ranking's
+    arrays. Rows are unindented and separated by single newlines so markdown
+    keeps them in one HTML block.
+    """
+    n        = len(ranked)
+    names    = ranked["neighbourhood"].to_numpy()
+    scores   = ranked["fit_score"].to_numpy()
+    is_list  = names == LISTING_NEIGHBOURHOOD
+    score_cls = np.select([scores >= 88, scores >= 68], ["score-good", "score-mid"], "score-low")
+    card_cls = np.where(is_list, "rank-row top", "rank-row")
+    rank_cls = np.where(is_list, "rank-num top", "rank-num")
+    uncertain = ranked["uncertain"].to_numpy() if "uncertain" in ranked else np.zeros(n, dtype=bool)
+    distances = ranked["distance_km"].to_numpy() if "distance_km" in ranked else None
+    snippets = description_snippets()
+
+    rows = []
+    for i in range(n):
+        tags = (THIS_LISTING_TAG if is_list[i] else "") + (UNCERTAIN_TAG if uncertain[i] else "")
+        desc = snippets.get(names[i], "...")
+        if distances is not None:
+            desc = f"{distances[i]:.1f} km away · {desc}"
+        rows.append(
+            f'<div class="{card_cls[i]}"><div class="{rank_cls[i]}">#{i+1}</div>'
+            f'<div style="flex:1;"><div class="rank-name">{names[i]}{tags}</div>'
+            f'<div class="rank-desc">{desc}</div></div>'
+            f'<div class="rank-score {score_cls[i]}">{scores[i]:.0f}'
+            f'<span style="font-weight:400;color:#AAAAAA;font-size:0.8rem;"> · {fit_label(scores[i])[0]}</span>'
+            f'</div></div>'
+        )
+    return "\n".join(rows)
+
+# ── Ranking ────────────────────────────────────────────────────────────────────
+def get_rankings(user_prefs, proximity):
+    """
+    Full ranking plus the (optionally proximity-aware) comparison list.
+    The last result is kept in session state keyed by the preference tuple,
+    so re-running the same query does no model work.
+    """
+    key = (tuple(user_prefs[d] for d in DIMENSIONS), proximity)
+    cached = st.session_state.get("last_ranking")
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    # Run model across all neighbourhoods; only the listing's row shows an interval,
+    # and the comparison list needs just the `uncertain` flag, which comes without one
+    ranked = rank_neighbourhoods(user_prefs, scores_df, intervals=True)
+
+    # The comparison list can additionally weigh distance from the listing
+    distance_weight, radius_km = PROXIMITY_MODES[proximity]
+    if distance_weight or radius_km:
+        compare = rank_neighbourhoods(
+            user_prefs, scores_df,
+            origin=NBHD_COORDS[LISTING_NEIGHBOURHOOD],
+            distance_weight=distance_weight, radius_km=radius_km, geo_index=geo_index,
+        )
+    else:
+        compare = ranked
+
+    st.session_state["last_ranking"] = (key, (ranked, compare))
+    return ranked, compare
+
+# ── Event log ──────────────────────────────────────────────────────────────────
+# One background writer per server process, shared by all sessions
+@st.cache_resource
+def get_event_log():
+    return EventLog()
+
+def session_id():
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+def log_feedback(query_id):
+    value = st.session_state.get(f"feedback_{query_id}")
+    if value is not None:
+        get_event_log().log("feedback", session_id=session_id(), query_id=query_id, thumbs_up=bool(value))
 
 # ══════════════════════════════════════════════════════════════════════════════
 # NAVIGATION
@@ -362,30 +517,26 @@ st.markdown("""
 
 st.markdown("<div style='height:16px'></div>", unsafe_allow_html=True)
 
-# Photo grid — fixed height, cropped to fit, matching Airbnb listing layout
-import base64
-
-def img_to_b64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
+# Photo grid — fixed height, cropped to fit, matching Airbnb listing layout.
+# Photos are right-sized renditions served as static files (see assets.py).
+IMG_STYLE = "width:100%;height:100%;object-fit:cover;display:block;"
 
-liv = img_to_b64("images/living.jpg")
-bed = img_to_b64("images/bedroom.jpg")
-kit = img_to_b64("images/kitchen.jpg")
-
-st.markdown(f"""
+def photo_grid_html():
+    static_serving = st.get_option("server.enableStaticServing")
+    liv = picture_html("images/living.jpg", MAIN_HEIGHT, static_serving, IMG_STYLE)
+    bed = picture_html("images/bedroom.jpg", SUB_HEIGHT, static_serving, IMG_STYLE)
+    kit = picture_html("images/kitchen.jpg", SUB_HEIGHT, static_serving, IMG_STYLE)
+    return f"""
 <div style="display:grid;grid-template-columns:1fr 1fr;grid-template-rows:200px 200px;gap:8px;border-radius:12px;overflow:hidden;margin-bottom:24px;">
-  <div style="grid-row:1/3;overflow:hidden;">
-    <img src="data:image/jpeg;base64,{liv}" style="width:100%;height:100%;object-fit:cover;display:block;">
-  </div>
-  <div style="overflow:hidden;">
-    <img src="data:image/jpeg;base64,{bed}" style="width:100%;height:100%;object-fit:cover;display:block;">
-  </div>
-  <div style="overflow:hidden;">
-    <img src="data:image/jpeg;base64,{kit}" style="width:100%;height:100%;object-fit:cover;display:block;">
-  </div>
+  <div style="grid-row:1/3;overflow:hidden;">{liv}</div>
+  <div style="overflow:hidden;">{bed}</div>
+  <div style="overflow:hidden;">{kit}</div>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+grid_html = photo_grid_html()
+LOGGER.info("Photo grid payload this rerun: %d bytes", len(grid_html.encode()))
+st.markdown(grid_html, unsafe_allow_html=True)
 
 st.markdown("<div style='height:24px'></div>", unsafe_allow_html=True)
 
@@ -504,20 +655,23 @@ with tab_overview:
 # ══════════════════════════════════════════════════════════════════════════════
 # TAB 2 — VIBE CHECK
 # ══════════════════════════════════════════════════════════════════════════════
-with tab_vibecheck:
+# A fragment: slider and button interactions rerun only this function, not the
+# page config, CSS, listing header and Overview tab above.
+@st.fragment
+def vibe_check():
 
     st.markdown("<div style='height:12px'></div>", unsafe_allow_html=True)
 
     # Feature intro — reads like a real product feature, not a student demo
     col_intro, _ = st.columns([2, 1], gap="large")
     with col_intro:
-        st.markdown("""
+        st.markdown(f"""
         <h3 style="font-size:1.3rem;font-weight:800;margin:0 0 10px;">
           Does this neighbourhood match your travel style?
         </h3>
         <p style="font-size:0.92rem;color:#444;line-height:1.7;margin:0;">
           Vibe Check analyses thousands of real guest reviews to build a detailed profile of every
-          Barcelona neighbourhood across eight dimensions. Tell us what matters to you and we'll
+          Barcelona neighbourhood across {len(DIMENSIONS)} dimensions. Tell us what matters to you and we'll
           rank them by how well they match — so you can book knowing the area works for you,
           not just the flat.
         </p>
@@ -534,7 +688,7 @@ with tab_vibecheck:
     for i, dim in enumerate(DIMENSIONS):
         with (col_a if i % 2 == 0 else col_b):
             user_prefs[dim] = st.slider(
-                DIM_LABELS[dim],
+                DIM_LABELS.get(dim, dim),
                 min_value=1, max_value=5, value=3,
                 key=f"pref_{dim}",
             )
@@ -559,42 +713,67 @@ with tab_vibecheck:
             value="Balanced",
         )
 
+    # Proximity needs pipeline-computed centroids for every neighbourhood
+    proximity = "Doesn't matter"
+    if geo_index is not None:
+        proximity = st.select_slider(
+            "Distance from this listing",
+            options=list(PROXIMITY_MODES),
+            value="Doesn't matter",
+        )
+
     st.markdown("<div style='height:8px'></div>", unsafe_allow_html=True)
     run = st.button("Find my best neighbourhood match", use_container_width=True)
 
     # ── Results ────────────────────────────────────────────────────────────────
-    # ── Results ────────────────────────────────────────────────────────────────
+    # Results stay on screen while the inputs are unchanged, so interacting with
+    # the feedback widget (which reruns the fragment) doesn't hide them.
+    query_key = (tuple(user_prefs[d] for d in DIMENSIONS), proximity)
     if run:
+        get_profiler().count("queries")
+        st.session_state["shown_query"] = query_key
+        st.session_state["query_id"] = uuid.uuid4().hex
+        get_event_log().log(
+            "query", session_id=session_id(), query_id=st.session_state["query_id"],
+            prefs=user_prefs, trip_type=trip_type, nights=int(nights), pace=pace, proximity=proximity,
+        )
 
-        # This listing is in El Born (Sant Pere, Santa Caterina i la Ribera)
-        LISTING_NEIGHBOURHOOD = "Sant Pere, Santa Caterina i la Ribera"
-
-        bar = st.progress(0, text="Loading review data...")
-        for pct, msg in [(25, "Building your preference profile..."),
-                         (55, "Scoring El Born against your priorities..."),
-                         (85, "Comparing with other neighbourhoods..."),
-                         (100, "Done")]:
-            time.sleep(0.2)
-            bar.progress(pct, text=msg)
-        time.sleep(0.25)
-        bar.empty()
-
-        # Run model across all neighbourhoods
-        ranked = rank_neighbourhoods(user_prefs, scores_df)
-
-        # Pull the listing's neighbourhood row specifically
-        listing_row   = ranked[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD].iloc[0]
-        listing_score = listing_row["fit_score"]
-        listing_label, listing_color = fit_label(listing_score)
-        listing_desc, listing_pros, listing_cons = NBHD_INFO.get(LISTING_NEIGHBOURHOOD, ("", [], []))
-        listing_analysis = get_match_analysis(user_prefs, listing_row)
-        listing_lat, listing_lon = NBHD_COORDS[LISTING_NEIGHBOURHOOD]
-
-        # Rank position of this listing's neighbourhood
-        listing_rank = ranked[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD].index[0] + 1
-        total_nbhds  = len(ranked)
-        rank_pct     = round((1 - (listing_rank - 1) / total_nbhds) * 100)
+    if st.session_state.get("shown_query") == query_key:
+        query_id = st.session_state["query_id"]
+
+        # Spinner only — it is on screen exactly as long as the model is working
+        with st.spinner("Scoring neighbourhoods against your priorities..."), get_profiler().span("rank") as rank_span:
+            ranked, compare = get_rankings(user_prefs, proximity)
+            rank_span.rows = len(ranked)
+
+        if run:
+            get_event_log().log(
+                "ranking", session_id=session_id(), query_id=query_id,
+                ranking=compare[["neighbourhood", "fit_score"]].head(10).to_dict("records"),
+                listing_fit_score=float(ranked.loc[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD, "fit_score"].iloc[0]),
+            )
 
+        with get_profiler().span("analysis"):
+            # Pull the listing's neighbourhood row specifically
+            listing_row   = ranked[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD].iloc[0]
+            listing_score = listing_row["fit_score"]
+            listing_label, listing_color = fit_label(listing_score)
+            listing_range = (
+                f"range {listing_row['fit_score_lo']:.0f}–{listing_row['fit_score_hi']:.0f}"
+                if "fit_score_lo" in listing_row else "out of 100"
+            )
+            listing_desc, listing_pros, listing_cons = NBHD_INFO.get(LISTING_NEIGHBOURHOOD, ("", [], []))
+            listing_analysis = get_match_analysis(user_prefs, listing_row)
+            listing_lat, listing_lon = NBHD_COORDS[LISTING_NEIGHBOURHOOD]
+
+            # Rank position of this listing's neighbourhood
+            listing_rank = ranked[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD].index[0] + 1
+            total_nbhds  = len(ranked)
+            rank_pct     = round((1 - (listing_rank - 1) / total_nbhds) * 100)
+
+        # Render covers building and queueing the result elements in this script
+        # thread, not the browser's paint
+        render_span = get_profiler().start("render", rows=len(compare))
         st.markdown("<div style='height:16px'></div>", unsafe_allow_html=True)
         st.markdown(
             f"<div style='font-size:0.78rem;font-weight:700;text-transform:uppercase;"
@@ -622,7 +801,7 @@ with tab_vibecheck:
                     st.markdown(f"""
                     <div style="text-align:center;padding:12px 0;">
                       <div style="font-size:3.5rem;font-weight:800;color:{listing_color};line-height:1;">{listing_score:.0f}</div>
-                      <div style="font-size:0.75rem;color:#717171;margin-top:4px;">out of 100</div>
+                      <div style="font-size:0.75rem;color:#717171;margin-top:4px;">{listing_range}</div>
                       <div style="font-size:0.82rem;font-weight:700;color:{listing_color};margin-top:6px;">{listing_label}</div>
                     </div>
                     """, unsafe_allow_html=True)
@@ -652,17 +831,17 @@ with tab_vibecheck:
                     if listing_analysis["strengths"]:
                         st.markdown("<div style='font-size:0.78rem;font-weight:700;text-transform:uppercase;letter-spacing:0.5px;color:#00A699;margin-bottom:8px;'>Works well for you</div>", unsafe_allow_html=True)
                         for d, _ in listing_analysis["strengths"]:
-                            st.markdown(f"<div style='font-size:0.85rem;margin-bottom:5px;'>&#10003; {DIM_LABELS[d]}</div>", unsafe_allow_html=True)
+                            st.markdown(f"<div style='font-size:0.85rem;margin-bottom:5px;'>&#10003; {DIM_LABELS.get(d, d)}</div>", unsafe_allow_html=True)
                 with c_fri:
                     if listing_analysis["frictions"]:
                         st.markdown("<div style='font-size:0.78rem;font-weight:700;text-transform:uppercase;letter-spacing:0.5px;color:#FC642D;margin-bottom:8px;'>Worth considering</div>", unsafe_allow_html=True)
                         for d, _ in listing_analysis["frictions"]:
-                            st.markdown(f"<div style='font-size:0.85rem;margin-bottom:5px;'>&#9651; {DIM_LABELS[d]}</div>", unsafe_allow_html=True)
+                            st.markdown(f"<div style='font-size:0.85rem;margin-bottom:5px;'>&#9651; {DIM_LABELS.get(d, d)}</div>", unsafe_allow_html=True)
 
             # Radar — your preferences vs El Born's profile
             st.markdown("<div style='font-size:0.88rem;font-weight:700;margin:18px 0 6px;'>Your priorities vs. El Born's profile</div>", unsafe_allow_html=True)
             st.plotly_chart(
-                make_radar(user_prefs, listing_row),
+                make_radar(LISTING_NEIGHBOURHOOD, tuple(user_prefs[d] for d in DIMENSIONS)),
                 use_container_width=True,
                 config={"displayModeBar": False},
             )
@@ -672,7 +851,7 @@ with tab_vibecheck:
             for dim in DIMENSIONS:
                 score = float(listing_row[dim])
                 pref  = user_prefs[dim]
-                lbl   = DIM_LABELS[dim]
+                lbl   = DIM_LABELS.get(dim, dim)
                 st.progress(int(score), text=f"{lbl} — {score:.0f}/100 (your priority: {pref}/5)")
 
         with col_map:
@@ -699,6 +878,13 @@ with tab_vibecheck:
                         st.write(f"- {con}")
                 st.caption("Derived from aggregated guest review sentiment across Inside Airbnb Barcelona listings.")
 
+            # Profile-based "similar areas" — independent of the user's sliders
+            similar = similar_neighbourhoods(LISTING_NEIGHBOURHOOD, similar_lookup, k=3)
+            if similar:
+                st.markdown("<div style='font-size:0.88rem;font-weight:700;margin:14px 0 8px;'>If you like El Born, try</div>", unsafe_allow_html=True)
+                for name, sim in similar:
+                    st.markdown(f"<div style='font-size:0.85rem;margin-bottom:5px;'>{name} <span style='color:#AAAAAA;'>· {sim:.0f}% similar</span></div>", unsafe_allow_html=True)
+
         st.divider()
 
         # ══════════════════════════════════════════════════════════════════════
@@ -716,40 +902,32 @@ with tab_vibecheck:
             unsafe_allow_html=True,
         )
 
-        for i, row in ranked.iterrows():
-            name       = row["neighbourhood"]
-            score      = row["fit_score"]
-            label, _   = fit_label(score)
-            is_listing = (name == LISTING_NEIGHBOURHOOD)
-
-            if score >= 88:   score_cls = "score-good"
-            elif score >= 68: score_cls = "score-mid"
-            else:             score_cls = "score-low"
-
-            card_cls   = "rank-row top" if is_listing else "rank-row"
-            rank_cls   = "rank-num top" if is_listing else "rank-num"
-            desc_short = NBHD_INFO.get(name, ("",))[0][:68] + "..."
-            this_tag   = (
-                "&nbsp;<span style='background:#FF385C;color:white;font-size:0.65rem;"
-                "font-weight:700;padding:2px 7px;border-radius:8px;vertical-align:middle;"
-                "'>This listing</span>"
-            ) if is_listing else ""
+        # Rows always show the fit score; say so when the order also weighs distance
+        distance_weight, radius_km = PROXIMITY_MODES[proximity]
+        if distance_weight and "blended_score" in compare:
+            st.markdown(
+                "<div style='font-size:0.8rem;color:#717171;margin:-8px 0 12px;'>"
+                "Ordered by fit and distance from El Born, so a closer area can rank "
+                "above one with a higher fit score.</div>",
+                unsafe_allow_html=True,
+            )
 
-            st.markdown(f"""
-            <div class="{card_cls}">
-              <div class="{rank_cls}">#{i+1}</div>
-              <div style="flex:1;">
-                <div class="rank-name">{name}{this_tag}</div>
-                <div class="rank-desc">{desc_short}</div>
-              </div>
-              <div class="rank-score {score_cls}">{score:.0f}
-                <span style="font-weight:400;color:#AAAAAA;font-size:0.8rem;"> · {label}</span>
-              </div>
-            </div>
-            """, unsafe_allow_html=True)
+        if compare.empty:
+            st.info(f"No neighbourhoods within {radius_km:g} km of El Born. Try a wider distance setting.")
+        else:
+            # One markdown delta for the whole list instead of one per neighbourhood
+            st.markdown(ranking_list_html(compare), unsafe_allow_html=True)
 
         st.divider()
         st.markdown("<div style='font-size:0.82rem;color:#717171;margin-bottom:8px;'>Was this helpful?</div>", unsafe_allow_html=True)
-        feedback = st.feedback("thumbs")
+        feedback = st.feedback("thumbs", key=f"feedback_{query_id}", on_change=log_feedback, args=(query_id,))
         if feedback is not None:
             st.success("Thanks for the feedback. We use this to improve the model.")
+
+        render_span.stop()
+        get_profiler().gauge("events_dropped", get_event_log().stats()["dropped"])
+        get_profiler().write(min_interval=APP_METRICS_INTERVAL)
+
+
+with tab_vibecheck:
+    vibe_check()
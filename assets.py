@@ -0,0 +1,112 @@
+"""
+assets.py — Listing photo assets
+
+Turns the full-resolution photos in images/ into right-sized JPEG and WebP
+renditions for the listing photo grid. Renditions are written once to
+static/listing/ and only rebuilt when the source file's mtime changes.
+With Streamlit static serving enabled they are referenced by URL, so the
+browser fetches and caches them once; the URLs carry the source mtime, so an
+edited photo gets a new URL rather than a stale cached copy. Without static
+serving, the WebP rendition is inlined as a data URI, which is still a
+fraction of the original JPEG.
+
+Encoded results are memoised per process, keyed on the source mtime, so all
+sessions share them and an edited photo is picked up without a restart.
+"""
+
+import base64
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+from PIL import Image, ImageOps
+
+RENDITIONS_DIR = os.path.join("static", "listing")
+# Streamlit serves ./static/ at app/static/ when server.enableStaticServing is on
+RENDITIONS_URL = "app/static/listing"
+
+# Photo grid boxes are 200 px rows; renditions are 2x for high-DPI screens
+MAIN_HEIGHT = 2 * 408   # spans both rows plus the 8 px gap
+SUB_HEIGHT  = 2 * 200
+
+JPEG_QUALITY = 80
+WEBP_QUALITY = 78
+
+# lru_cache doesn't serialise concurrent first calls, so sessions starting
+# together would otherwise encode the same rendition side by side
+_ENCODE_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One resized photo, as a JPEG and a WebP file on disk."""
+    jpeg_path: str
+    webp_path: str
+    jpeg_url: str
+    webp_url: str
+    jpeg_bytes: int
+    webp_bytes: int
+
+
+def _is_fresh(path: str, src_mtime: float) -> bool:
+    return os.path.exists(path) and os.path.getmtime(path) >= src_mtime
+
+
+def _save(img: Image.Image, path: str, fmt: str, **kwargs) -> None:
+    """Encode to a temporary file and rename it, so the static server never serves a partial image."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    img.save(tmp, fmt, **kwargs)
+    os.replace(tmp, path)
+
+
+@lru_cache(maxsize=32)
+def _rendition(src: str, src_mtime: float, height: int) -> Rendition:
+    stem = f"{os.path.splitext(os.path.basename(src))[0]}-{height}"
+    jpeg_path = os.path.join(RENDITIONS_DIR, stem + ".jpg")
+    webp_path = os.path.join(RENDITIONS_DIR, stem + ".webp")
+
+    with _ENCODE_LOCK:
+        if not (_is_fresh(jpeg_path, src_mtime) and _is_fresh(webp_path, src_mtime)):
+            os.makedirs(RENDITIONS_DIR, exist_ok=True)
+            img = ImageOps.exif_transpose(Image.open(src)).convert("RGB")
+            if img.height > height:
+                img = img.resize((round(img.width * height / img.height), height), Image.LANCZOS)
+            _save(img, jpeg_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            _save(img, webp_path, "WEBP", quality=WEBP_QUALITY, method=6)
+
+    # The source mtime in the query string busts browser caches when a photo changes
+    version = f"?v={int(src_mtime)}"
+    return Rendition(
+        jpeg_path=jpeg_path,
+        webp_path=webp_path,
+        jpeg_url=f"{RENDITIONS_URL}/{stem}.jpg{version}",
+        webp_url=f"{RENDITIONS_URL}/{stem}.webp{version}",
+        jpeg_bytes=os.path.getsize(jpeg_path),
+        webp_bytes=os.path.getsize(webp_path),
+    )
+
+
+def rendition(src: str, height: int) -> Rendition:
+    """Resized renditions of `src`, rebuilt only when the source mtime changes."""
+    return _rendition(src, os.path.getmtime(src), height)
+
+
+@lru_cache(maxsize=32)
+def _data_uri(path: str, mtime: float) -> str:
+    with open(path, "rb") as f:
+        return "data:image/webp;base64," + base64.b64encode(f.read()).decode()
+
+
+def picture_html(src: str, height: int, static_serving: bool, style: str) -> str:
+    """
+    Markup for one photo: a <picture> with WebP and JPEG URLs when static
+    serving is on, otherwise an <img> with the WebP rendition inlined.
+    """
+    r = rendition(src, height)
+    if static_serving:
+        return (
+            f'<picture><source srcset="{r.webp_url}" type="image/webp">'
+            f'<img src="{r.jpeg_url}" style="{style}"></picture>'
+        )
+    return f'<img src="{_data_uri(r.webp_path, os.path.getmtime(r.webp_path))}" style="{style}">'
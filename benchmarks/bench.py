@@ -0,0 +1,218 @@
+"""
+benchmarks/bench.py — Micro-benchmarks for the ranking and training hot paths
+
+Runs fully offline on synthetic data (benchmarks/synthetic.py) and measures:
+  - single-query latency of rank_neighbourhoods (with and without intervals),
+    get_match_analysis and fit_label
+  - batch ranking throughput
+  - pipeline throughput (keyword matching + sentiment, and aggregation with
+    bootstrap intervals) in reviews/sec
+  - peak traced memory per case
+
+Results are written as JSON and can be compared against a stored baseline;
+the comparison exits non-zero when any case regresses beyond the tolerance.
+
+Usage:
+    python -m benchmarks.bench                                   # small scale
+    python -m benchmarks.bench --scale medium --out bench.json
+    python -m benchmarks.bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_prefs, synthetic_reviews, synthetic_scores
+from features import DIMENSION_KEYWORDS, MIN_NEIGHBOURHOOD_REVIEWS, build_feature_store, build_scores_table
+from model import fit_label, get_match_analysis, rank_neighbourhoods
+
+SCALES = {
+    "small":  {"neighbourhoods": [62, 1_000],            "reviews": [2_000],           "queries": 200},
+    "medium": {"neighbourhoods": [62, 1_000, 10_000],    "reviews": [2_000, 20_000],   "queries": 500},
+    "large":  {"neighbourhoods": [62, 10_000, 100_000],  "reviews": [20_000, 100_000], "queries": 1_000},
+}
+
+# Synthetic neighbourhoods per pipeline case are capped near Barcelona's count,
+# and sized so each clears MIN_NEIGHBOURHOOD_REVIEWS with margin — otherwise
+# build_scores_table drops them all and the aggregate case times an empty table
+PIPELINE_MAX_NEIGHBOURHOODS = 60
+
+
+def _peak_mb(fn) -> float:
+    """Peak traced allocation of one extra call, kept out of the timed runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def _latency(fn, calls: list) -> dict:
+    """Per-call latency percentiles over a list of argument tuples."""
+    times = np.empty(len(calls))
+    for i, args in enumerate(calls):
+        start = time.perf_counter()
+        fn(*args)
+        times[i] = time.perf_counter() - start
+    return {
+        "p50_ms": round(float(np.percentile(times, 50)) * 1e3, 4),
+        "p95_ms": round(float(np.percentile(times, 95)) * 1e3, 4),
+    }
+
+
+def bench_ranking(n: int, n_queries: int) -> list[dict]:
+    scores = synthetic_scores(n)
+    prefs = synthetic_prefs(n_queries)
+    results = []
+
+    # The interval path is slower (and holds ~90 MB per call at 100k
+    # neighbourhoods), so it gets a smaller sample
+    for name, kwargs, sample in [("rank_neighbourhoods", {}, prefs),
+                                 ("rank_neighbourhoods.intervals", {"intervals": True}, prefs[:50])]:
+        run = lambda p, kw=kwargs: rank_neighbourhoods(p, scores, **kw)
+        metrics = _latency(run, [(p,) for p in sample])
+        metrics["peak_mb"] = round(_peak_mb(lambda: run(prefs[0])), 3)
+        results.append({"name": f"{name}[n={n}]", "primary": "p50_ms", "metrics": metrics})
+
+    # Batch throughput — back-to-back queries, as a replica would serve them
+    start = time.perf_counter()
+    for p in prefs:
+        rank_neighbourhoods(p, scores)
+    elapsed = time.perf_counter() - start
+    results.append({"name": f"rank_neighbourhoods.batch[n={n}]", "primary": "queries_per_s",
+                    "metrics": {"queries_per_s": round(n_queries / elapsed, 1)}})
+
+    ranked = rank_neighbourhoods(prefs[0], scores, intervals=True)
+    rows = [(p, ranked.iloc[i % len(ranked)]) for i, p in enumerate(prefs)]
+    results.append({"name": f"get_match_analysis[n={n}]", "primary": "p50_ms",
+                    "metrics": _latency(get_match_analysis, rows)})
+    return results
+
+
+def bench_fit_label(n_calls: int) -> dict:
+    scores = np.random.default_rng(0).uniform(50, 100, n_calls)
+    start = time.perf_counter()
+    for s in scores:
+        fit_label(s)
+    elapsed = time.perf_counter() - start
+    return {"name": "fit_label", "primary": "calls_per_s",
+            "metrics": {"calls_per_s": round(n_calls / elapsed, 1)}}
+
+
+def bench_pipeline(m: int, keyword_density: float, language_mix: dict | None) -> list[dict]:
+    n_neighbourhoods = min(PIPELINE_MAX_NEIGHBOURHOODS, max(1, m // (2 * MIN_NEIGHBOURHOOD_REVIEWS)))
+    reviews = synthetic_reviews(m, n_neighbourhoods=n_neighbourhoods,
+                                keyword_density=keyword_density, language_mix=language_mix)
+    reviews["comments"] = reviews["comments"].str.lower()
+    dims = list(DIMENSION_KEYWORDS)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with quiet:
+        start = time.perf_counter()
+        store = build_feature_store(reviews, DIMENSION_KEYWORDS)
+        features_s = time.perf_counter() - start
+        features_peak = _peak_mb(lambda: build_feature_store(reviews.head(min(m, 2_000)), DIMENSION_KEYWORDS))
+
+        start = time.perf_counter()
+        table = build_scores_table(store, dims)
+        aggregate_s = time.perf_counter() - start
+        aggregate_peak = _peak_mb(lambda: build_scores_table(store, dims))
+
+    return [
+        {"name": f"pipeline.features[m={m}]", "primary": "reviews_per_s",
+         "metrics": {"reviews_per_s": round(m / features_s, 1), "seconds": round(features_s, 3),
+                     "peak_mb_2k_reviews": round(features_peak, 3)}},
+        {"name": f"pipeline.aggregate[m={m}]", "primary": "reviews_per_s",
+         "metrics": {"reviews_per_s": round(m / aggregate_s, 1), "seconds": round(aggregate_s, 3),
+                     "peak_mb": round(aggregate_peak, 3), "neighbourhoods": len(table)}},
+    ]
+
+
+def run(scale: str, keyword_density: float, language_mix: dict | None) -> dict:
+    cfg = SCALES[scale]
+    results = []
+    for n in cfg["neighbourhoods"]:
+        print(f"Ranking — {n} neighbourhoods × {len(DIMENSION_KEYWORDS)} dimensions...")
+        results += bench_ranking(n, cfg["queries"])
+    results.append(bench_fit_label(100_000))
+    for m in cfg["reviews"]:
+        print(f"Pipeline — {m} synthetic reviews (keyword density {keyword_density})...")
+        results += bench_pipeline(m, keyword_density, language_mix)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "scale": scale,
+            "keyword_density": keyword_density,
+            "language_mix": language_mix,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+# Metrics where lower is better; everything else is a rate
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "seconds", "peak_mb"}
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print each case's primary metric against the baseline; return the cases that regressed."""
+    base = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        if r["name"] not in base:
+            continue
+        key = r["primary"]
+        now, before = r["metrics"][key], base[r["name"]]["metrics"][key]
+        if not before:
+            continue
+        change = (now - before) / before if key in LOWER_IS_BETTER else (before - now) / before
+        marker = "REGRESSION" if change > tolerance else "ok"
+        verdict = f"{abs(change):.0%} {'worse' if change > 0 else 'better'}"
+        print(f"  {marker:<10} {r['name']:<45} {key}: {before} -> {now} ({verdict})")
+        if change > tolerance:
+            regressions.append(r["name"])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for ranking and pipeline hot paths.")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--keyword-density", type=float, default=0.5)
+    parser.add_argument("--language-mix", type=json.loads, default=None,
+                        help='JSON, e.g. \'{"en": 0.5, "es": 0.5}\'')
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--save-baseline", help="Also write the results to this path")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown")
+    args = parser.parse_args()
+
+    report = run(args.scale, args.keyword_density, args.language_mix)
+    for r in report["results"]:
+        print(f"  {r['name']:<45} {r['metrics']}")
+
+    for path in filter(None, [args.out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved: {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nComparing with {args.baseline} (tolerance {args.tolerance:.0%})...")
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
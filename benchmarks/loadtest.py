@@ -0,0 +1,295 @@
+"""
+benchmarks/loadtest.py — Load generator for the ranking core and the running app
+
+Replays preference payloads against either target, at several concurrency
+levels, and reports throughput, p50/p95/p99 latency and process RSS per level.
+
+  core  Simulated sessions are threads calling the same model path as one
+        "Find my best neighbourhood match" click (rank with intervals, then
+        match analysis), in-process. RSS is this process.
+  http  Simulated sessions are real Streamlit clients: each loads the page,
+        opens the /_stcore/stream websocket and does a full script run, then
+        replays payloads as Vibe Check fragment reruns (slider states plus a
+        button click), timing each until the server reports script_finished.
+        RSS is the server process given by --server-pid (Linux /proc).
+
+Payloads come from JSONL files — any line with a "prefs" object, or with
+dimension names as top-level keys (e.g. query events in events/*.jsonl) —
+or from a synthetic distribution over the 1–5 sliders. Lines without
+preferences (such as a backlog file) are skipped.
+
+Usage:
+    python -m benchmarks.loadtest core --concurrency 1,4,16 --requests 400
+    python -m benchmarks.loadtest core --corpus events/*.jsonl
+    python -m benchmarks.loadtest http --url http://localhost:8501 --server-pid 1234 --concurrency 1,8,32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from model import dimensions, get_match_analysis, load_scores, rank_neighbourhoods
+
+LISTING_NEIGHBOURHOOD = "Sant Pere, Santa Caterina i la Ribera"
+FIND_BUTTON_LABEL = "Find my best neighbourhood match"
+
+
+# ── Payloads ───────────────────────────────────────────────────────────────────
+def load_corpus(paths: list[str], dims: list[str]) -> list[dict]:
+    """Preference dicts from JSONL files; dimensions missing from a line default to 3."""
+    payloads, skipped = [], 0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                obj = json.loads(line)
+                prefs = obj.get("prefs", obj) if isinstance(obj, dict) else {}
+                found = {d: int(prefs[d]) for d in dims if isinstance(prefs.get(d), (int, float))}
+                if not found:
+                    skipped += 1
+                    continue
+                payloads.append({d: min(5, max(1, found.get(d, 3))) for d in dims})
+    print(f"Loaded {len(payloads)} payloads ({skipped} lines without preferences skipped)")
+    return payloads
+
+
+def synthetic_payloads(n: int, dims: list[str], distribution: str, seed: int = 0) -> list[dict]:
+    """uniform: every slider value equally likely; centred: binomial around the default of 3."""
+    rng = np.random.default_rng(seed)
+    if distribution == "uniform":
+        values = rng.integers(1, 6, (n, len(dims)))
+    else:
+        values = rng.binomial(4, 0.5, (n, len(dims))) + 1
+    return [dict(zip(dims, map(int, row))) for row in values]
+
+
+# ── Measurement helpers ────────────────────────────────────────────────────────
+def rss_mb(pid: int) -> float | None:
+    """Current RSS of a process from /proc; for this process, its peak RSS where /proc is missing."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return None
+
+
+class RssSampler:
+    """
+    Background sampler tracking the peak RSS of a process while a level runs.
+    Without a pid nothing is sampled and the peak stays None.
+    """
+
+    def __init__(self, pid: int | None, interval: float = 0.25):
+        self.pid, self.interval = pid, interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.peak = max(self.peak or 0, value)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def summarise(latencies: list[float], wall: float, errors: list[str], concurrency: int, rss: float | None) -> dict:
+    arr = np.array(latencies) * 1e3 if latencies else np.array([np.nan])
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_types": dict(Counter(e.split(":")[0] for e in errors)),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+    }
+
+
+# ── core: in-process ranking ───────────────────────────────────────────────────
+def run_core_level(scores, payloads: list[dict], concurrency: int, n_requests: int) -> dict:
+    def one_click(prefs):
+        start = time.perf_counter()
+        ranked = rank_neighbourhoods(prefs, scores, intervals=True)
+        listing = ranked[ranked["neighbourhood"] == LISTING_NEIGHBOURHOOD]
+        get_match_analysis(prefs, listing.iloc[0] if len(listing) else ranked.iloc[0])
+        return time.perf_counter() - start
+
+    work = [payloads[i % len(payloads)] for i in range(n_requests)]
+    with RssSampler(os.getpid()) as sampler, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(one_click, work))
+        wall = time.perf_counter() - start
+    return summarise(latencies, wall, [], concurrency, sampler.peak)
+
+
+# ── http: real Streamlit sessions over the websocket protocol ──────────────────
+async def _rerun(ws, widget_states=(), fragment_id: str = "") -> tuple[float, dict, str]:
+    """
+    Send one rerun request and wait for script_finished. Returns the latency,
+    the widget ids seen (label -> id) and the fragment id of the Vibe Check tab.
+    """
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    msg = BackMsg()
+    msg.rerun_script.fragment_id = fragment_id
+    for widget_id, kind, value in widget_states:
+        state = msg.rerun_script.widget_states.widgets.add()
+        state.id = widget_id
+        if kind == "trigger":
+            state.trigger_value = True
+        else:
+            state.double_array_value.data.extend([value])
+
+    start = time.perf_counter()
+    await ws.send(msg.SerializeToString())
+    widgets, vibe_fragment = {}, ""
+    while True:
+        fwd = ForwardMsg()
+        fwd.ParseFromString(await ws.recv())
+        kind = fwd.WhichOneof("type")
+        if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+            element = fwd.delta.new_element
+            etype = element.WhichOneof("type")
+            if etype in ("slider", "button"):
+                widget = getattr(element, etype)
+                widgets[widget.id] = widget.label
+                if widget.label == FIND_BUTTON_LABEL:
+                    vibe_fragment = fwd.delta.fragment_id
+        elif kind == "script_finished":
+            return time.perf_counter() - start, widgets, vibe_fragment
+
+
+def _error(errors: list, exc: Exception) -> None:
+    """Record a failed request by type, printing the first of each type."""
+    message = f"{type(exc).__name__}: {exc}"
+    if not any(e.split(":")[0] == type(exc).__name__ for e in errors):
+        print(f"  error: {message}")
+    errors.append(message)
+
+
+async def _http_session(url: str, payloads: list[dict], dims: list[str], latencies: list, errors: list):
+    from websockets.asyncio.client import connect
+
+    ws_url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+    try:
+        # Page load, then the initial full script run every new session triggers
+        await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=30).read())
+        async with connect(ws_url, max_size=None) as ws:
+            _, widgets, fragment = await _rerun(ws)
+            slider_ids = {d: wid for wid, label in widgets.items() for d in dims if wid.endswith(f"-pref_{d}")}
+            button_id = next(wid for wid, label in widgets.items() if label == FIND_BUTTON_LABEL)
+
+            for prefs in payloads:
+                states = [(slider_ids[d], "slider", prefs[d]) for d in dims if d in slider_ids]
+                states.append((button_id, "trigger", None))
+                try:
+                    latency, _, _ = await _rerun(ws, states, fragment)
+                    latencies.append(latency)
+                except Exception as exc:
+                    _error(errors, exc)
+    except Exception as exc:
+        _error(errors, exc)
+
+
+async def _run_http_level(url, payloads, dims, concurrency, n_requests) -> tuple[list, list, float]:
+    per_session = max(1, n_requests // concurrency)
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _http_session(url, [payloads[(s * per_session + i) % len(payloads)] for i in range(per_session)],
+                      dims, latencies, errors)
+        for s in range(concurrency)
+    ])
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_http_level(url, payloads, dims, concurrency, n_requests, server_pid) -> dict:
+    # Imported here, outside the per-session error handling, so a missing or
+    # too-old websockets (the asyncio client needs >= 13) fails loudly
+    import websockets.asyncio.client  # noqa: F401
+
+    with RssSampler(server_pid) as sampler:
+        latencies, errors, wall = asyncio.run(_run_http_level(url, payloads, dims, concurrency, n_requests))
+    return summarise(latencies, wall, errors, concurrency, sampler.peak)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay preference traffic against the ranking core or the app.")
+    parser.add_argument("target", choices=["core", "http"])
+    parser.add_argument("--corpus", nargs="*", default=[], help="JSONL files with preference payloads")
+    parser.add_argument("--synthetic", choices=["uniform", "centred"], default="centred",
+                        help="Distribution used when no corpus is given")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated session counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--scores", default="neighbourhood_scores.csv")
+    parser.add_argument("--url", default="http://localhost:8501")
+    parser.add_argument("--server-pid", type=int,
+                        help="Streamlit server PID, for RSS in http mode (reported as null without it)")
+    parser.add_argument("--out", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    scores = load_scores(args.scores)
+    dims = dimensions(scores.columns)
+    payloads = load_corpus(args.corpus, dims) if args.corpus else synthetic_payloads(1_000, dims, args.synthetic)
+    if not payloads:
+        sys.exit("No preference payloads found — pass a corpus with prefs, or omit --corpus for synthetic traffic")
+
+    if args.target == "http" and args.server_pid is None:
+        print("No --server-pid given: server RSS will be reported as null")
+
+    levels = []
+    for concurrency in map(int, args.concurrency.split(",")):
+        print(f"{args.target}: {concurrency} concurrent sessions, {args.requests} requests...")
+        if args.target == "core":
+            level = run_core_level(scores, payloads, concurrency, args.requests)
+        else:
+            level = run_http_level(args.url, payloads, dims, concurrency, args.requests, args.server_pid)
+        print(f"  {level}")
+        levels.append(level)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.target,
+            "url": args.url if args.target == "http" else None,
+            "payloads": len(payloads),
+            "source": args.corpus or f"synthetic:{args.synthetic}",
+            "cpu_count": os.cpu_count(),
+        },
+        "levels": levels,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved: {args.out}")
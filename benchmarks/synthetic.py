@@ -0,0 +1,84 @@
+"""
+benchmarks/synthetic.py — Offline synthetic data for benchmarks
+
+Generates neighbourhood score tables shaped like neighbourhood_scores.csv
+and merged review frames shaped like train.py's `df`, so the ranking and
+pipeline hot paths can be measured without downloading Inside Airbnb data.
+Everything is seeded and reproducible.
+"""
+
+import numpy as np
+import pandas as pd
+
+from features import DIMENSION_KEYWORDS
+from model import ci_columns
+
+# Filler sentences per language. Only English carries keywords and
+# sentiment-bearing words, like the real corpus, where TextBlob mostly sees
+# non-English text as neutral.
+FILLER = {
+    "en": ["the apartment was lovely", "great host and very clean", "we had a wonderful stay",
+           "the flat was small but comfortable", "check-in was easy", "would definitely come back",
+           "the bed was a bit hard", "terrible wifi during our stay"],
+    "es": ["el piso estaba muy limpio", "el anfitrión fue muy amable", "volveremos sin duda",
+           "la cama era cómoda"],
+    "ca": ["el pis era molt net", "l'amfitrió va ser molt amable", "hi tornarem segur"],
+    "fr": ["l'appartement était très propre", "hôte très sympathique", "nous reviendrons"],
+}
+DEFAULT_LANGUAGE_MIX = {"en": 0.7, "es": 0.15, "ca": 0.05, "fr": 0.1}
+
+
+def synthetic_scores(n_neighbourhoods: int, dims: list[str] | None = None,
+                     with_intervals: bool = True, seed: int = 0) -> pd.DataFrame:
+    """Score table with the real artifact's layout: scores in a 55–75 band, optional CIs."""
+    dims = dims or list(DIMENSION_KEYWORDS)
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"neighbourhood": [f"Neighbourhood {i}" for i in range(n_neighbourhoods)]})
+    for dim in dims:
+        df[dim] = rng.uniform(55, 75, n_neighbourhoods).round(1)
+    if with_intervals:
+        for dim in dims:
+            half = rng.uniform(0.5, 6, n_neighbourhoods)
+            cols = ci_columns(dim)
+            df[cols["lo"]] = (df[dim] - half).round(1)
+            df[cols["hi"]] = (df[dim] + half).round(1)
+            df[cols["n"]] = rng.integers(5, 2000, n_neighbourhoods)
+    return df
+
+
+def synthetic_prefs(n_queries: int, dims: list[str] | None = None, seed: int = 0) -> list[dict]:
+    """Random slider settings, 1–5 per dimension."""
+    dims = dims or list(DIMENSION_KEYWORDS)
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1, 6, (n_queries, len(dims)))
+    return [dict(zip(dims, map(int, row))) for row in values]
+
+
+def synthetic_reviews(n_reviews: int, n_neighbourhoods: int = 60, keyword_density: float = 0.5,
+                      language_mix: dict[str, float] | None = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Merged, lower-cased review frame (neighbourhood_cleansed, comments).
+
+    keyword_density : probability that an English review mentions at least one
+                      dimension keyword (each hit picks a random dimension)
+    language_mix    : share of reviews per language in FILLER
+    """
+    language_mix = language_mix or DEFAULT_LANGUAGE_MIX
+    rng = np.random.default_rng(seed)
+    langs = list(language_mix)
+    probs = np.array([language_mix[l] for l in langs], dtype=float)
+    lang = rng.choice(langs, n_reviews, p=probs / probs.sum())
+
+    all_keywords = [kw for kws in DIMENSION_KEYWORDS.values() for kw in kws]
+    comments = []
+    for i in range(n_reviews):
+        sentences = list(rng.choice(FILLER[lang[i]], rng.integers(2, 5)))
+        if lang[i] == "en" and rng.random() < keyword_density:
+            for kw in rng.choice(all_keywords, rng.integers(1, 4)):
+                sentences.append(f"loved the {kw} around here")
+        comments.append(". ".join(sentences))
+
+    return pd.DataFrame({
+        "neighbourhood_cleansed": [f"Neighbourhood {i}" for i in rng.integers(0, n_neighbourhoods, n_reviews)],
+        "comments": comments,
+    })
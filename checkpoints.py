@@ -0,0 +1,72 @@
+"""
+checkpoints.py — Content-addressed checkpoints for the offline pipeline
+
+Each train.py stage saves its output as a parquet file named after the stage
+and a key hashed from everything that determines that output: the upstream
+stage's key plus the stage's own parameters (download URLs, keyword lists,
+bootstrap settings...). Keys therefore chain, and a rerun reuses every
+stage whose inputs are unchanged while anything downstream of a change gets
+a new key and is recomputed. Old checkpoints are only overwritten when a
+stage is forced to recompute (train.py --force / --profile); delete
+checkpoints/ to reclaim the space.
+
+Output:
+    checkpoints/<stage>-<key>.parquet
+    checkpoints/<stage>-<key>/ (chunked stages, e.g. sentiment scoring)
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from instrumentation import count
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+def checkpoint_key(*parts) -> str:
+    """Stable short hash of JSON-serialisable stage inputs."""
+    blob = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class Checkpoints:
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = directory
+
+    def path(self, stage: str, key: str) -> str:
+        return os.path.join(self.directory, f"{stage}-{key}.parquet")
+
+    def chunk_dir(self, stage: str, key: str) -> str:
+        """Directory for a stage that checkpoints its own progress in chunks."""
+        return os.path.join(self.directory, f"{stage}-{key}")
+
+    def exists(self, stage: str, key: str) -> bool:
+        return os.path.exists(self.path(stage, key))
+
+    def load(self, stage: str, key: str) -> pd.DataFrame:
+        return pd.read_parquet(self.path(stage, key))
+
+    def save(self, stage: str, key: str, df: pd.DataFrame) -> None:
+        """Write via a temporary file so a killed run never leaves a partial checkpoint."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(stage, key)
+        df.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+    def get(self, stage: str, key: str, compute, force: bool = False) -> pd.DataFrame:
+        """
+        Load the stage's checkpoint if it exists, otherwise compute() and save
+        it. With force, always compute; the result replaces the checkpoint.
+        """
+        if force:
+            print(f"Recomputing {stage} (ignoring checkpoint {key})")
+        elif self.exists(stage, key):
+            print(f"Reusing {stage} checkpoint ({key})")
+            count("checkpoints_reused")
+            return self.load(stage, key)
+        df = compute()
+        self.save(stage, key, df)
+        return df
@@ -0,0 +1,140 @@
+"""
+events.py — Query, ranking and feedback event log
+
+Events are collected for retraining without adding disk I/O to the Streamlit
+script thread: log() only puts the event on a bounded in-memory queue, and a
+background thread writes batches to append-only JSONL files that rotate
+once they reach a size limit. When the queue is full, events are dropped and
+counted instead of blocking the UI; batches that fail to write are counted
+as dropped too and logged as a warning. stats() exposes the totals, and the
+app copies the drop count into its metrics report. close() (also registered
+with atexit) drains the queue before the process exits.
+
+Output:
+    events/events-<start time>-<pid>-<seq>.jsonl
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+EVENTS_DIR = "events"
+
+LOGGER = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventLog:
+    def __init__(
+        self,
+        directory: str = EVENTS_DIR,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_file_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._written = 0
+        self._closed = False
+
+        self._prefix = f"events-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self._seq = 0
+        self._path = None
+
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event_type: str, **fields) -> bool:
+        """
+        Enqueue one event without blocking. Returns False (and counts a drop)
+        if the queue is full or the log is closed.
+        """
+        event = {"ts": datetime.now(timezone.utc).isoformat(), "type": event_type, **fields}
+        if not self._closed:
+            try:
+                self._queue.put_nowait(event)
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self._dropped += 1
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queued": self._queue.qsize(), "written": self._written, "dropped": self._dropped}
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop accepting events, flush everything queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        stats = self.stats()
+        if stats["dropped"]:
+            LOGGER.warning("Event log closed with %d events dropped (%d written)", stats["dropped"], stats["written"])
+
+    # ── Writer thread ──────────────────────────────────────────────────────────
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # Anything enqueued before the sentinel is already in the batch
+                self._write(batch)
+                return
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _current_path(self) -> str:
+        if self._path is None or (
+            os.path.exists(self._path) and os.path.getsize(self._path) >= self.max_file_bytes
+        ):
+            self._seq += 1
+            self._path = os.path.join(self.directory, f"{self._prefix}-{self._seq:04d}.jsonl")
+        return self._path
+
+    def _write(self, batch: list) -> None:
+        if not batch:
+            return
+        lines = "".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in batch)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._current_path()
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as exc:
+            # Never let logging take the app down — count the batch as dropped
+            with self._lock:
+                self._dropped += len(batch)
+            LOGGER.warning("Dropped %d events: could not write to %s (%s)", len(batch), self.directory, exc)
+            return
+        with self._lock:
+            self._written += len(batch)
@@ -0,0 +1,310 @@
+"""
+features.py — Review feature store
+
+Persists the per-review features the offline pipeline computes — the
+lower-cased review text, one keyword-hit flag per dimension, and the review's
+TextBlob polarity — so that adding a new lifestyle dimension, or editing one
+keyword list, only matches that dimension's keywords against the stored text
+and re-aggregates that one column of neighbourhood_scores.csv.
+
+Polarity is a property of the whole review, not of a dimension, so it is
+computed once per review and only for reviews that hit at least one keyword.
+Reviews first hit by a new dimension are scored then and written back.
+
+Usage:
+    python features.py "Shopping" shop shopping boutique mall "shopping centre"
+
+Output:
+    neighbourhood_scores.csv (one column added or replaced)
+    feature_store/ (updated hit flags and polarities)
+"""
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from textblob import TextBlob
+
+from instrumentation import count, span
+from model import add_similar_neighbourhoods, ci_columns, dimensions
+
+FEATURE_STORE_DIR = "feature_store"
+REVIEWS_FILE      = "reviews.parquet"
+MANIFEST_FILE     = "manifest.json"
+
+# Neighbourhoods with fewer reviews than this are left out of the score artifact
+MIN_NEIGHBOURHOOD_REVIEWS = 100
+
+N_BOOTSTRAP = 2000
+CI_ALPHA    = 0.05
+
+# Reviews per sentiment chunk — the unit of progress a resumed train.py run keeps
+SENTIMENT_CHUNK_SIZE = 20_000
+CHUNK_PATTERN = re.compile(r"rows-(\d+)-(\d+)\.npy")
+
+# Keyword dictionaries per lifestyle dimension, used by train.py for full builds
+DIMENSION_KEYWORDS = {
+    "Nightlife & Bars":    ["bar", "nightlife", "club", "pub", "party", "drinks", "cocktail", "tapas", "nightout"],
+    "Peaceful & Quiet":    ["quiet", "peaceful", "calm", "relaxing", "tranquil", "silent", "noisy", "loud", "noise"],
+    "Walkability":         ["walk", "walking distance", "stroll", "walkable", "on foot", "nearby", "close to everything"],
+    "Nature & Parks":      ["park", "garden", "nature", "green", "trees", "outdoor", "fresh air", "beach"],
+    "Food & Restaurants":  ["restaurant", "food", "eat", "cafe", "coffee", "market", "cuisine", "bakery", "brunch"],
+    "Safety":              ["safe", "safety", "secure", "dangerous", "unsafe", "sketchy", "feel safe"],
+    "Public Transport":    ["metro", "bus", "transport", "subway", "train", "tram", "transit", "connection"],
+    "Family-Friendly":     ["family", "kids", "children", "stroller", "playground", "child-friendly", "families"],
+}
+
+
+def hit_column(dim: str) -> str:
+    """Feature-store column flagging reviews that mention one of a dimension's keywords."""
+    return f"hit:{dim}"
+
+
+def match_keywords(texts: pd.Series, keywords: list[str]) -> np.ndarray:
+    """
+    Vectorised `any(kw in text for kw in keywords)` over lower-cased review text.
+    Keywords are plain substrings (phrases like "walking distance" included),
+    so they are escaped into a single alternation.
+    """
+    pattern = "|".join(re.escape(kw) for kw in keywords)
+    return texts.str.contains(pattern, regex=True).to_numpy()
+
+
+def review_polarity(text: str) -> float:
+    return TextBlob(text).sentiment.polarity
+
+
+def match_features(df: pd.DataFrame, dimension_keywords: dict[str, list[str]]) -> pd.DataFrame:
+    """
+    Per-review keyword-hit table from merged, lower-cased reviews
+    (columns: neighbourhood_cleansed, comments). Polarity is left unscored.
+    """
+    store = pd.DataFrame({
+        "neighbourhood": df["neighbourhood_cleansed"].to_numpy(),
+        "comments":      df["comments"].to_numpy(),
+    })
+    with span("keyword_matching", rows=len(store)):
+        for dim, keywords in dimension_keywords.items():
+            store[hit_column(dim)] = match_keywords(store["comments"], keywords)
+    store["polarity"] = np.nan
+    return store
+
+
+def score_sentiment(store: pd.DataFrame, dims: list[str], chunk_dir: str | None = None,
+                    chunk_size: int = SENTIMENT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Fill in polarity for every review that hits at least one dimension.
+
+    Reviews are scored in chunks; with chunk_dir, each finished chunk is saved
+    there as rows-<start>-<stop>.npy (positions among the hit reviews) and
+    reused on the next call, so an interrupted run resumes where it stopped —
+    also with a different chunk_size. chunk_dir must be specific to this
+    store's hit flags.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    store = store.copy()
+    any_hit = store[[hit_column(d) for d in dims]].any(axis=1).to_numpy()
+    rows = np.flatnonzero(any_hit)
+    count("reviews_with_hits", len(rows))
+    print(f"  Sentiment for {len(rows)}/{len(store)} reviews with a keyword hit...")
+
+    polarity = store["polarity"].to_numpy(dtype=float, copy=True)
+    done = np.zeros(len(rows), dtype=bool)
+    if chunk_dir:
+        os.makedirs(chunk_dir, exist_ok=True)
+        for name in sorted(os.listdir(chunk_dir)):
+            m = CHUNK_PATTERN.fullmatch(name)
+            if m:
+                lo, hi = int(m.group(1)), int(m.group(2))
+                polarity[rows[lo:hi]] = np.load(os.path.join(chunk_dir, name))
+                done[lo:hi] = True
+                count("sentiment_chunks_reused")
+
+    # Score the gaps, one chunk at a time, never crossing into a saved range
+    start = 0
+    while not done.all():
+        start += int(np.argmin(done[start:]))
+        stop = min(start + chunk_size, len(rows))
+        saved = np.flatnonzero(done[start:stop])
+        if len(saved):
+            stop = start + saved[0]
+        chunk = rows[start:stop]
+        with span("sentiment", rows=len(chunk)):
+            values = store["comments"].iloc[chunk].map(review_polarity).to_numpy(dtype=float)
+        if chunk_dir:
+            path = os.path.join(chunk_dir, f"rows-{start:09d}-{stop:09d}.npy")
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, values)
+            os.replace(f"{path}.tmp", path)
+        polarity[chunk] = values
+        done[start:stop] = True
+        print(f"  Scored {int(done.sum())}/{len(rows)} reviews")
+    store["polarity"] = polarity
+    return store
+
+
+def build_feature_store(df: pd.DataFrame, dimension_keywords: dict[str, list[str]]) -> pd.DataFrame:
+    """
+    Compute the per-review feature table from merged, lower-cased reviews
+    (columns: neighbourhood_cleansed, comments).
+    """
+    return score_sentiment(match_features(df, dimension_keywords), list(dimension_keywords))
+
+
+def save_feature_store(store: pd.DataFrame, dimension_keywords: dict[str, list[str]],
+                       path: str = FEATURE_STORE_DIR) -> None:
+    os.makedirs(path, exist_ok=True)
+    store.to_parquet(os.path.join(path, REVIEWS_FILE), index=False)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump({"dimensions": dimension_keywords, "n_reviews": len(store)}, f, indent=2, ensure_ascii=False)
+
+
+def load_manifest(path: str = FEATURE_STORE_DIR) -> dict[str, list[str]] | None:
+    """Keyword lists recorded in a feature store, or None if there is no store."""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)["dimensions"]
+
+
+def load_feature_store(path: str = FEATURE_STORE_DIR) -> tuple[pd.DataFrame, dict[str, list[str]]]:
+    """Return the feature table and the keyword lists its hit columns were built from."""
+    dimension_keywords = load_manifest(path)
+    if dimension_keywords is None:
+        raise FileNotFoundError(f"No feature store at {path}/ — run train.py first")
+    return pd.read_parquet(os.path.join(path, REVIEWS_FILE)), dimension_keywords
+
+
+def merged_keywords(defaults: dict[str, list[str]], path: str = FEATURE_STORE_DIR) -> dict[str, list[str]]:
+    """
+    Keyword lists for a full rebuild: the defaults, overridden and extended by
+    any dimension added or edited with this script since, so a retrain keeps them.
+    """
+    recorded = load_manifest(path) or {}
+    changed = [d for d, kws in recorded.items() if defaults.get(d) != kws]
+    if changed:
+        print(f"Keeping keyword lists from {path}/{MANIFEST_FILE} for: {', '.join(changed)}")
+    return {**defaults, **recorded}
+
+
+def bootstrap_ci(polarities: np.ndarray, rng: np.random.Generator, n_resamples: int = N_BOOTSTRAP,
+                 alpha: float = CI_ALPHA, max_block: int = 2_000_000) -> np.ndarray:
+    """
+    Percentile bootstrap CI of the mean polarity for one (neighbourhood, dimension) cell.
+    Each resample is a multinomial draw of review counts, so a whole block of
+    resamples is one (block × n) count matrix and one matrix-vector product.
+    Blocks are sized to keep the count matrix under max_block entries.
+    """
+    n = len(polarities)
+    per_block = max(1, max_block // n)
+    means = np.empty(n_resamples)
+    for start in range(0, n_resamples, per_block):
+        stop = min(start + per_block, n_resamples)
+        counts = rng.multinomial(n, np.full(n, 1 / n), size=stop - start)
+        means[start:stop] = counts @ polarities / n
+    return np.quantile(means, [alpha / 2, 1 - alpha / 2])
+
+
+def to_score(polarity):
+    """Map polarity (-1..1) to the 0–100 score scale."""
+    return ((polarity + 1) / 2 * 100).round(1)
+
+
+def aggregate_dimension(store: pd.DataFrame, dim: str, seed: int = 42) -> pd.DataFrame:
+    """
+    Mean polarity, bootstrap interval and review count per neighbourhood for one
+    dimension, all on the 0–100 scale. Indexed by neighbourhood; neighbourhoods
+    without any matching review are absent.
+    """
+    rng = np.random.default_rng(seed)
+    hits = store.loc[store[hit_column(dim)], ["neighbourhood", "polarity"]]
+    rows = []
+    for nbhd, pol in hits.groupby("neighbourhood")["polarity"]:
+        values = pol.to_numpy(dtype=float)
+        lo, hi = bootstrap_ci(values, rng)
+        rows.append({"neighbourhood": nbhd, "score": values.mean(), "lo": lo, "hi": hi, "n": len(values)})
+    agg = pd.DataFrame(rows, columns=["neighbourhood", "score", "lo", "hi", "n"]).set_index("neighbourhood")
+    for col in ["score", "lo", "hi"]:
+        agg[col] = to_score(agg[col])
+    return agg
+
+
+def set_dimension_columns(pivot: pd.DataFrame, dim: str, agg: pd.DataFrame) -> pd.DataFrame:
+    """
+    Write one dimension's score and interval columns into the wide score table.
+    Missing scores fall back to the median across neighbourhoods; missing
+    intervals stay NaN with a count of 0.
+    """
+    pivot = pivot.copy()
+    cols = ci_columns(dim)
+    aligned = agg.reindex(pivot["neighbourhood"])
+    pivot[dim] = aligned["score"].to_numpy()
+    pivot[dim] = pivot[dim].fillna(pivot[dim].median())
+    pivot[cols["lo"]] = aligned["lo"].to_numpy()
+    pivot[cols["hi"]] = aligned["hi"].to_numpy()
+    pivot[cols["n"]] = aligned["n"].fillna(0).astype(int).to_numpy()
+    return pivot
+
+
+def build_scores_table(store: pd.DataFrame, dims: list[str]) -> pd.DataFrame:
+    """Aggregate every dimension into the wide neighbourhood score table."""
+    review_counts = store.groupby("neighbourhood").size()
+    review_counts = review_counts[review_counts >= MIN_NEIGHBOURHOOD_REVIEWS]
+    pivot = pd.DataFrame({"neighbourhood": review_counts.index, "n_reviews": review_counts.to_numpy()})
+
+    for dim in dims:
+        print(f"  Aggregating {dim} ({N_BOOTSTRAP} bootstrap resamples per neighbourhood)...")
+        pivot = set_dimension_columns(pivot, dim, aggregate_dimension(store, dim))
+
+    # Score columns first, then the per-dimension interval columns
+    ci_cols = [col for d in dims for col in ci_columns(d).values()]
+    return pivot[["neighbourhood"] + dims + ["n_reviews"] + ci_cols]
+
+
+def rescore_dimension(dim: str, keywords: list[str], scores_path: str = "neighbourhood_scores.csv",
+                      store_path: str = FEATURE_STORE_DIR) -> pd.DataFrame:
+    """
+    Add or replace one dimension without re-running the pipeline: match its
+    keywords against the stored review text, score sentiment only for newly
+    hit reviews, re-aggregate that column and rebuild the similar-areas index.
+    """
+    store, dimension_keywords = load_feature_store(store_path)
+    store[hit_column(dim)] = match_keywords(store["comments"], keywords)
+
+    missing = store[hit_column(dim)] & store["polarity"].isna()
+    print(f"  {int(store[hit_column(dim)].sum())} reviews mention {dim}; "
+          f"{int(missing.sum())} need new sentiment scores...")
+    store.loc[missing, "polarity"] = store.loc[missing, "comments"].map(review_polarity)
+
+    dimension_keywords[dim] = keywords
+    save_feature_store(store, dimension_keywords, store_path)
+
+    scores = pd.read_csv(scores_path)
+    is_new = dim not in scores.columns
+    scores = set_dimension_columns(scores, dim, aggregate_dimension(store, dim))
+    if is_new:
+        # Keep score columns together: insert the new one after the last existing dimension
+        existing = dimensions(scores.columns.drop(dim))
+        cols = list(scores.columns.drop(dim))
+        cols.insert(cols.index(existing[-1]) + 1, dim)
+        scores = scores[cols]
+    scores = add_similar_neighbourhoods(scores)
+    scores.to_csv(scores_path, index=False)
+    return scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add or re-score one lifestyle dimension from the feature store.")
+    parser.add_argument("dimension", help='Column name, e.g. "Shopping"')
+    parser.add_argument("keywords", nargs="+", help="Lower-case keywords or phrases")
+    parser.add_argument("--scores", default="neighbourhood_scores.csv")
+    parser.add_argument("--store", default=FEATURE_STORE_DIR)
+    args = parser.parse_args()
+
+    rescore_dimension(args.dimension, [kw.lower() for kw in args.keywords], args.scores, args.store)
+    print(f"\nSaved: {args.scores} ({args.dimension} re-aggregated)")
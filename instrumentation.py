@@ -0,0 +1,248 @@
+"""
+instrumentation.py — Stage timing spans, counters and profiling
+
+A Profiler records named spans — wall time, CPU time, rows processed and
+peak RSS — plus free-form counters, and writes them as a JSON report.
+Repeated spans (one per app rerun, say) are aggregated by name; nested spans
+are named by their path, e.g. "aggregation/bootstrap".
+
+Library code calls the module-level span() and count(), which are no-ops
+unless a profiler has been activated, so features.py can be instrumented
+without changing its signatures.
+
+One span can also run under cProfile: pass its name as `profile`, or
+"slowest" to pick the slowest top-level span of the previous report at the
+same path. The stats are written next to the report as <report>.<span>.prof
+(for snakeviz / pstats) and a top-functions .txt, with a warning if the span
+never ran.
+
+With keep_previous, spans of the previous report that this run never
+recorded (say, stages loaded from a checkpoint) are carried into the new
+report, marked "previous_run", so it still covers every stage.
+
+Usage:
+    profiler = Profiler("train", report_path="metrics/train.json").activate()
+    with span("download") as s:
+        ...
+        s.rows = len(reviews)
+    count("reviews_with_hits", n)
+    profiler.write()
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+METRICS_DIR = "metrics"
+PROFILE_TOP_N = 40
+
+_ACTIVE = None
+
+
+def peak_rss_mb() -> float:
+    """Process high-water RSS (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def report_spans(report_path: str) -> list[dict]:
+    """Spans of an existing report, or [] if there is none."""
+    if not os.path.exists(report_path):
+        return []
+    with open(report_path) as f:
+        return json.load(f)["spans"]
+
+
+def slowest_span(report_path: str) -> str | None:
+    """Name of the top-level span with the most wall time in an existing report."""
+    spans = [s for s in report_spans(report_path) if "/" not in s["name"]]
+    return max(spans, key=lambda s: s["wall_s"])["name"] if spans else None
+
+
+class Span:
+    """One running span. Set `rows` before it stops to get a rows/s figure."""
+
+    def __init__(self, profiler: "Profiler", name: str, rows: int | None = None):
+        self.profiler, self.name, self.rows = profiler, name, rows
+        self._wall = time.perf_counter()
+        self._cpu = profiler.cpu_clock()
+        self._rss = peak_rss_mb()
+
+    def stop(self) -> None:
+        wall = time.perf_counter() - self._wall
+        cpu = self.profiler.cpu_clock() - self._cpu
+        rss = peak_rss_mb()
+        self.profiler._record(self.name, wall, cpu, self.rows, rss, rss - self._rss)
+
+
+class Profiler:
+    """
+    Thread-safe collector of spans and counters. cpu_clock defaults to process
+    CPU time; the app passes time.thread_time so concurrent sessions' spans
+    don't count each other's work.
+    """
+
+    def __init__(self, name: str, report_path: str | None = None, profile: str | None = None,
+                 cpu_clock=time.process_time, keep_previous: bool = False):
+        self.name = name
+        self.report_path = report_path or os.path.join(METRICS_DIR, f"{name}.json")
+        self.cpu_clock = cpu_clock
+        self.started = datetime.now(timezone.utc)
+        self._previous = report_spans(self.report_path) if keep_previous else []
+
+        if profile == "slowest":
+            profile = slowest_span(self.report_path)
+            if profile is None:
+                print(f"No previous report at {self.report_path} — run once without --profile slowest first")
+        self.profile = profile
+        self._cprofile = cProfile.Profile() if profile else None
+        self._profile_lock = threading.Lock()
+        self._warned_unprofiled = False
+
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._stack = threading.local()
+        self._last_write = 0.0
+
+    def activate(self) -> "Profiler":
+        """Route the module-level span() and count() to this profiler."""
+        global _ACTIVE
+        _ACTIVE = self
+        return self
+
+    # ── Spans and counters ─────────────────────────────────────────────────────
+    def start(self, name: str, rows: int | None = None) -> Span:
+        """Start a span explicitly, for blocks too long to indent; call .stop() on it."""
+        return Span(self, name, rows)
+
+    @contextlib.contextmanager
+    def span(self, name: str, rows: int | None = None):
+        stack = self._stack.__dict__.setdefault("names", [])
+        stack.append(name)
+        path = "/".join(stack)
+        profiling = path == self.profile and self._profile_lock.acquire(blocking=False)
+        s = Span(self, path, rows)
+        try:
+            if profiling:
+                self._cprofile.enable()
+            yield s
+        finally:
+            if profiling:
+                self._cprofile.disable()
+                self._profile_lock.release()
+            s.stop()
+            stack.pop()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: int) -> None:
+        """Set a counter to a total kept elsewhere, such as the event log's drop count."""
+        with self._lock:
+            self._counters[name] = value
+
+    def _record(self, name, wall, cpu, rows, rss, rss_growth) -> None:
+        with self._lock:
+            agg = self._spans.setdefault(name, {
+                "calls": 0, "wall_s": 0.0, "wall_max_s": 0.0, "cpu_s": 0.0,
+                "rows": None, "peak_rss_mb": 0.0, "rss_growth_mb": 0.0,
+            })
+            agg["calls"] += 1
+            agg["wall_s"] += wall
+            agg["wall_max_s"] = max(agg["wall_max_s"], wall)
+            agg["cpu_s"] += cpu
+            if rows is not None:
+                agg["rows"] = (agg["rows"] or 0) + int(rows)
+            agg["peak_rss_mb"] = max(agg["peak_rss_mb"], rss)
+            agg["rss_growth_mb"] += rss_growth
+
+    # ── Report ─────────────────────────────────────────────────────────────────
+    def report(self) -> dict:
+        with self._lock:
+            spans = [
+                {
+                    "name": name,
+                    **{k: round(v, 4) if isinstance(v, float) else v for k, v in agg.items()},
+                    "rows_per_s": round(agg["rows"] / agg["wall_s"], 1) if agg["rows"] and agg["wall_s"] else None,
+                }
+                for name, agg in self._spans.items()
+            ]
+            spans += [{**s, "previous_run": True} for s in self._previous if s["name"] not in self._spans]
+            counters = dict(self._counters)
+        return {
+            "meta": {
+                "name": self.name,
+                "started": self.started.isoformat(),
+                "written": datetime.now(timezone.utc).isoformat(),
+                "pid": os.getpid(),
+                "python": sys.version.split()[0],
+            },
+            "spans": spans,
+            "counters": counters,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "profiled_span": self.profile,
+        }
+
+    def write(self, min_interval: float = 0.0) -> str | None:
+        """
+        Write the report (and cProfile stats, if any) atomically. With
+        min_interval, skip the write if the last one was more recent.
+        """
+        now = time.monotonic()
+        if min_interval and now - self._last_write < min_interval:
+            return None
+        self._last_write = now
+
+        directory = os.path.dirname(self.report_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.report_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp, self.report_path)
+
+        if self._cprofile is not None:
+            self._write_profile()
+        return self.report_path
+
+    def _write_profile(self) -> None:
+        stem = f"{os.path.splitext(self.report_path)[0]}.{self.profile.replace('/', '.')}"
+        with self._profile_lock:
+            try:
+                stats = pstats.Stats(self._cprofile)
+            except TypeError:
+                # The span never ran, so there is nothing to dump
+                if not self._warned_unprofiled:
+                    print(f"Warning: profiled span {self.profile!r} never ran — no {stem}.prof written")
+                    self._warned_unprofiled = True
+                return
+            stats.dump_stats(f"{stem}.prof")
+            text = io.StringIO()
+            pstats.Stats(self._cprofile, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        with open(f"{stem}.txt", "w") as f:
+            f.write(text.getvalue())
+
+
+def span(name: str, rows: int | None = None):
+    """Span on the active profiler, or a no-op context yielding a throwaway Span-like object."""
+    if _ACTIVE is None:
+        return contextlib.nullcontext(_NullSpan())
+    return _ACTIVE.span(name, rows)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, n)
+
+
+class _NullSpan:
+    rows = None
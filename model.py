@@ -3,33 +3,64 @@ model.py — Prediction logic
 
 """
 
+import re
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.neighbors import BallTree
+
+# Non-dimension columns of the score artifact and of rank_neighbourhoods output.
+# Every other column is a lifestyle dimension, so a dimension added to the
+# CSV (see features.py) is picked up by the ranking and the app automatically.
+AUX_COLUMNS = {
+    "neighbourhood", "n_reviews", "lat", "lon",
+    "similarity", "fit_score", "fit_score_lo", "fit_score_hi", "uncertain",
+    "distance_km", "blended_score",
+}
+AUX_PATTERN = re.compile(r"similar_\d+(_score)?|.+ \[(lo|hi|n)\]")
+
+# Number of "similar areas" stored per neighbourhood in the score artifact
+SIMILAR_K = 5
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Distance at which the proximity term of a blended ranking halves
+PROXIMITY_HALF_KM = 2.0
+
+# Fewer matching reviews than this in any dimension flags a neighbourhood as uncertain
+MIN_CELL_REVIEWS = 30
+
+# Normal quantile for the 95% fit-score interval
+FIT_INTERVAL_Z = 1.96
+
 
-DIMENSIONS = [
-    "Nightlife & Bars",
-    "Peaceful & Quiet",
-    "Walkability",
-    "Nature & Parks",
-    "Food & Restaurants",
-    "Safety",
-    "Public Transport",
-    "Family-Friendly",
-]
+def dimensions(columns) -> list[str]:
+    """Lifestyle dimension columns, in artifact order, among a frame's columns or a row's index."""
+    return [c for c in columns if c not in AUX_COLUMNS and not AUX_PATTERN.fullmatch(c)]
 
 
 def load_scores(path: str = "neighbourhood_scores.csv") -> pd.DataFrame:
     """Load pre-computed neighbourhood scores from the offline pipeline."""
     df = pd.read_csv(path)
-    # Ensure all dimension columns are present
-    for dim in DIMENSIONS:
-        if dim not in df.columns:
-            raise ValueError(f"Missing dimension column in CSV: {dim}")
+    # Ensure there are dimension columns to rank on
+    if not dimensions(df.columns):
+        raise ValueError(f"No dimension columns in CSV: {path}")
+    # Older artifacts predate the similar-areas columns — derive them on load
+    if not all(col in df.columns for col in similar_columns()):
+        df = add_similar_neighbourhoods(df)
     return df
 
 
-def rank_neighbourhoods(user_prefs: dict, scores_df: pd.DataFrame) -> pd.DataFrame:
+def rank_neighbourhoods(
+    user_prefs: dict,
+    scores_df: pd.DataFrame,
+    origin: tuple[float, float] | None = None,
+    distance_weight: float = 0.0,
+    radius_km: float | None = None,
+    geo_index: "GeoIndex | None" = None,
+    intervals: bool = False,
+) -> pd.DataFrame:
     """
     Core ranking model using cosine similarity.
 
@@ -40,31 +71,77 @@ def rank_neighbourhoods(user_prefs: dict, scores_df: pd.DataFrame) -> pd.DataFra
     relative priorities — cosine similarity captures this correctly, whereas
     Euclidean distance would treat them differently.
 
+    Proximity-aware mode
+    --------------------
+    When `origin` (lat, lon) is given and the scores carry lat/lon columns,
+    each neighbourhood also gets its distance to the origin. `radius_km`
+    drops everything further away (via `geo_index` when supplied), and
+    `distance_weight` in [0, 1] blends fit with a proximity term that halves
+    every PROXIMITY_HALF_KM. Both are computed over all candidates at once.
+
     Parameters
     ----------
-    user_prefs : dict  {dimension: int (1–5)}
-    scores_df  : DataFrame with neighbourhood scores (0–100 per dimension)
+    user_prefs      : dict  {dimension: int (1–5)} — one entry per dimension column
+    scores_df       : DataFrame with neighbourhood scores (0–100 per dimension)
+    origin          : optional (lat, lon) of the listing / search point
+    distance_weight : share of the blended score given to proximity
+    radius_km       : optional hard cut-off around `origin`
+    geo_index       : optional GeoIndex over scores_df rows for radius queries
+    intervals       : add fit-score intervals when the artifact has bootstrap CIs.
+                      Not needed for a plain comparison list — `uncertain` is
+                      added either way.
 
     Returns
     -------
     DataFrame sorted by fit_score descending, with added columns:
       similarity  : raw cosine similarity (0–1)
       fit_score   : similarity scaled to 0–100
+    With an origin, it also has distance_km and blended_score (0–100), and is
+    sorted by blended_score instead. When the artifact has bootstrap CIs it
+    has a boolean `uncertain`, and with intervals=True also fit_score_lo /
+    fit_score_hi (95% interval).
     """
-    user_vec = np.array([user_prefs[d] for d in DIMENSIONS]).reshape(1, -1)
-    nbhd_matrix = scores_df[DIMENSIONS].values
+    if origin is not None and radius_km is not None and geo_index is not None:
+        positions, _ = geo_index.query_radius(origin, radius_km)
+        scores_df = scores_df.iloc[np.sort(positions)]
+
+    dims = dimensions(scores_df.columns)
+    user_vec = np.array([user_prefs[d] for d in dims]).reshape(1, -1)
+    nbhd_matrix = scores_df[dims].values
 
     # L2-normalise both vectors before computing similarity
     user_norm = user_vec / (np.linalg.norm(user_vec) + 1e-9)
     nbhd_norms = np.linalg.norm(nbhd_matrix, axis=1, keepdims=True) + 1e-9
     nbhd_norm = nbhd_matrix / nbhd_norms
 
-    similarities = cosine_similarity(user_norm, nbhd_norm)[0]
+    # An empty radius leaves no candidates; fall through with empty arrays so
+    # both radius paths return the same (empty) columns
+    similarities = cosine_similarity(user_norm, nbhd_norm)[0] if len(nbhd_norm) else np.empty(0)
 
     result = scores_df.copy()
     result["similarity"] = similarities
     result["fit_score"] = (similarities * 100).round(1)
-    result = result.sort_values("fit_score", ascending=False).reset_index(drop=True)
+    sort_col = "fit_score"
+
+    if has_intervals(scores_df):
+        if intervals:
+            lo, hi = fit_score_interval(user_norm[0], scores_df)
+            result["fit_score_lo"] = lo
+            result["fit_score_hi"] = hi
+        n_cols = [ci_columns(d)["n"] for d in dims]
+        result["uncertain"] = scores_df[n_cols].min(axis=1).values < MIN_CELL_REVIEWS
+
+    if origin is not None and has_coordinates(scores_df):
+        distances = haversine_km(origin[0], origin[1], scores_df["lat"].values, scores_df["lon"].values)
+        proximity = 0.5 ** (distances / PROXIMITY_HALF_KM)
+        blended = (1 - distance_weight) * similarities + distance_weight * proximity
+        result["distance_km"] = distances.round(2)
+        result["blended_score"] = (blended * 100).round(1)
+        if radius_km is not None and geo_index is None:
+            result = result[distances <= radius_km]
+        sort_col = "blended_score"
+
+    result = result.sort_values(sort_col, ascending=False).reset_index(drop=True)
     return result
 
 
@@ -88,16 +165,17 @@ def get_match_analysis(user_prefs: dict, nbhd_row: pd.Series) -> dict:
       frictions  : list of (dimension, score) where score < 55 and priority >= 3
       model_note : short string explaining confidence level
     """
+    dims = dimensions(nbhd_row.index)
     strengths = [
-        (d, nbhd_row[d]) for d in DIMENSIONS
+        (d, nbhd_row[d]) for d in dims
         if nbhd_row[d] >= 70 and user_prefs.get(d, 3) >= 4
     ]
     frictions = [
-        (d, nbhd_row[d]) for d in DIMENSIONS
+        (d, nbhd_row[d]) for d in dims
         if nbhd_row[d] < 55 and user_prefs.get(d, 3) >= 3
     ]
     # Honest model confidence note
-    high_priority_dims = [d for d in DIMENSIONS if user_prefs.get(d, 3) >= 4]
+    high_priority_dims = [d for d in dims if user_prefs.get(d, 3) >= 4]
     if len(high_priority_dims) >= 4:
         note = "High confidence — you have strong preferences across many dimensions."
     elif len(high_priority_dims) == 0:
@@ -105,4 +183,183 @@ def get_match_analysis(user_prefs: dict, nbhd_row: pd.Series) -> dict:
     else:
         note = "Moderate confidence — the model is weighting your top priorities."
 
+    # Data quality — few matching reviews behind a dimension the user cares about
+    thin_dims = [
+        d for d in dims
+        if user_prefs.get(d, 3) >= 3 and ci_columns(d)["n"] in nbhd_row
+        and nbhd_row[ci_columns(d)["n"]] < MIN_CELL_REVIEWS
+    ]
+    if thin_dims:
+        note += f" Few reviews mention {', '.join(thin_dims)} here, so treat those scores as indicative."
+
     return {"strengths": strengths, "frictions": frictions, "model_note": note}
+
+
+def similar_columns(k: int = SIMILAR_K) -> list[str]:
+    """Column names used to store the top-k similar neighbourhoods in the CSV."""
+    cols = []
+    for i in range(1, k + 1):
+        cols += [f"similar_{i}", f"similar_{i}_score"]
+    return cols
+
+
+def top_k_similar(matrix: np.ndarray, k: int = SIMILAR_K, block_size: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k cosine neighbours for every row of `matrix`, excluding the row itself.
+
+    The pairwise similarity matrix is built one block of rows at a time, so
+    memory stays at block_size × N instead of the dense N × N matrix — this
+    keeps the build viable for listing-level or multi-city profiles.
+
+    Returns
+    -------
+    (indices, similarities), both shaped (N, k) and sorted best-first.
+    """
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0))
+    normed = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9)
+
+    indices = np.empty((n, k), dtype=np.int64)
+    sims = np.empty((n, k), dtype=np.float64)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = normed[start:stop] @ normed.T
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        # argpartition gets the k best in O(N); only those k are then sorted
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_sims = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_sims, axis=1)
+        indices[start:stop] = np.take_along_axis(part, order, axis=1)
+        sims[start:stop] = np.take_along_axis(part_sims, order, axis=1)
+    return indices, sims
+
+
+def add_similar_neighbourhoods(scores_df: pd.DataFrame, k: int = SIMILAR_K,
+                               block_size: int = 1024) -> pd.DataFrame:
+    """
+    Post-processing step for the score artifact: store each neighbourhood's
+    top-k most similar neighbourhoods as similar_{i} / similar_{i}_score columns.
+
+    Profiles are centred on the city-wide mean of each dimension first. Raw
+    scores all sit in a narrow 55–75 band, so uncentred cosine similarity is
+    ~0.99 for every pair; centring makes the similarity reflect how an area
+    differs from the city average.
+    """
+    profiles = scores_df[dimensions(scores_df.columns)].values.astype(float)
+    profiles = profiles - profiles.mean(axis=0)
+    indices, sims = top_k_similar(profiles, k=k, block_size=block_size)
+
+    names = scores_df["neighbourhood"].to_numpy()
+    result = scores_df.drop(columns=[c for c in scores_df.columns if c.startswith("similar_")])
+    similar = {}
+    for i in range(indices.shape[1]):
+        similar[f"similar_{i + 1}"] = names[indices[:, i]]
+        similar[f"similar_{i + 1}_score"] = (sims[:, i] * 100).round(1)
+    return pd.concat([result, pd.DataFrame(similar, index=result.index)], axis=1)
+
+
+def build_similar_lookup(scores_df: pd.DataFrame) -> dict[str, list[tuple[str, float]]]:
+    """Index the stored similar_* columns by neighbourhood for O(k) lookups."""
+    k = sum(1 for c in scores_df.columns if re.fullmatch(r"similar_\d+", c))
+    lookup = {}
+    for rec in scores_df[["neighbourhood"] + similar_columns(k)].to_dict("records"):
+        lookup[rec["neighbourhood"]] = [
+            (rec[f"similar_{i}"], float(rec[f"similar_{i}_score"]))
+            for i in range(1, k + 1)
+            if isinstance(rec[f"similar_{i}"], str)
+        ]
+    return lookup
+
+
+def similar_neighbourhoods(name: str, lookup: dict, k: int = SIMILAR_K) -> list[tuple[str, float]]:
+    """
+    "If you liked X, try…" — the k neighbourhoods with the most similar
+    profile to `name`, as (neighbourhood, similarity 0–100) pairs.
+    `lookup` comes from build_similar_lookup(), so this is O(k).
+    """
+    return lookup.get(name, [])[:k]
+
+
+def has_coordinates(scores_df: pd.DataFrame) -> bool:
+    """True when the score artifact carries pipeline-computed lat/lon centroids."""
+    return {"lat", "lon"} <= set(scores_df.columns) and scores_df[["lat", "lon"]].notna().all().all()
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class GeoIndex:
+    """
+    Haversine BallTree over a set of points — neighbourhood centroids today,
+    individual listings later. Query results are row positions into the
+    frame the index was built from, with distances in km.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray):
+        coords = np.radians(np.column_stack([lats, lons]))
+        self._tree = BallTree(coords, metric="haversine")
+
+    @classmethod
+    def from_scores(cls, scores_df: pd.DataFrame) -> "GeoIndex":
+        if not has_coordinates(scores_df):
+            raise ValueError("Score artifact has no lat/lon columns — re-run train.py")
+        return cls(scores_df["lat"].values, scores_df["lon"].values)
+
+    def query_radius(self, origin: tuple[float, float], radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Positions and distances (km) of every point within radius_km of origin."""
+        point = np.radians([origin])
+        ind, dist = self._tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM, return_distance=True)
+        return ind[0], dist[0] * EARTH_RADIUS_KM
+
+    def nearest(self, origin: tuple[float, float], k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """Positions and distances (km) of the k points closest to origin."""
+        dist, ind = self._tree.query(np.radians([origin]), k=k)
+        return ind[0], dist[0] * EARTH_RADIUS_KM
+
+
+def ci_columns(dim: str) -> dict[str, str]:
+    """CSV column names holding a dimension's bootstrap interval and review count."""
+    return {"lo": f"{dim} [lo]", "hi": f"{dim} [hi]", "n": f"{dim} [n]"}
+
+
+def has_intervals(scores_df: pd.DataFrame) -> bool:
+    """True when the score artifact carries bootstrap intervals for every dimension."""
+    dims = dimensions(scores_df.columns)
+    return all(col in scores_df.columns for d in dims for col in ci_columns(d).values())
+
+
+def fit_score_interval(user_unit: np.ndarray, scores_df: pd.DataFrame,
+                       z: float = FIT_INTERVAL_Z) -> tuple[np.ndarray, np.ndarray]:
+    """
+    95% interval of every neighbourhood's fit score given its per-dimension
+    bootstrap intervals.
+
+    Each dimension is treated as independent normal with sd = (hi - lo) / 3.92
+    and propagated to the cosine fit with the delta method: the gradient of
+    u·x/|x| is (u - fit·x̂)/|x|, so the fit's sd is |gradient × sd|. That is
+    O(N × D) time and memory, and agrees with Monte Carlo propagation to
+    ~0.1 points at these interval widths. Cells without an interval are held
+    at their point estimate.
+    """
+    dims = dimensions(scores_df.columns)
+    mean = scores_df[dims].values.astype(float)
+    lo = scores_df[[ci_columns(d)["lo"] for d in dims]].values.astype(float)
+    hi = scores_df[[ci_columns(d)["hi"] for d in dims]].values.astype(float)
+    sd = np.nan_to_num((hi - lo) / 3.92)
+
+    norms = np.linalg.norm(mean, axis=1, keepdims=True) + 1e-9
+    unit = mean / norms
+    fit = unit @ user_unit
+    grad = (user_unit - fit[:, None] * unit) / norms
+    fit_sd = np.sqrt(((grad * sd) ** 2).sum(axis=1))
+    fit_lo = np.clip((fit - z * fit_sd) * 100, 0, 100)
+    fit_hi = np.clip((fit + z * fit_sd) * 100, 0, 100)
+    return fit_lo.round(1), fit_hi.round(1)
@@ -4,23 +4,67 @@ Downloads real Airbnb review data for Barcelona from Inside Airbnb,
 scores each review across 8 lifestyle dimensions using TextBlob sentiment
 analysis, aggregates scores per neighbourhood, and saves neighbourhood_scores.csv.
 
+The pipeline runs as six stages — ingest, merge, match, score, aggregate,
+export — each checkpointed under checkpoints/ (see checkpoints.py).
+Sentiment scoring also checkpoints every chunk of reviews, so a rerun after
+a crash or a killed job skips finished stages and resumes mid-scoring.
+The stage functions are importable and take and return DataFrames. The
+match and score checkpoints hold only hit flags and polarity, row-aligned
+with the merge output, so the review text is not copied into every stage.
+
 Usage:
     python train.py
+    python train.py --profile slowest     # cProfile the slowest stage of the last run
+    python train.py --force score         # recompute one stage despite its checkpoint
 
 Output:
     neighbourhood_scores.csv
+    feature_store/ (per-review features reused by features.py)
+    metrics/train.json (wall/CPU time, rows and peak RSS per stage)
+    checkpoints/ (stage outputs, safe to delete)
 """
 
+import argparse
+import functools
+import numpy as np
 import pandas as pd
 import requests
 import io
-from textblob import TextBlob
 
-# ── 1. Download real Barcelona reviews from Inside Airbnb ──────────────────────
+from checkpoints import CHECKPOINT_DIR, Checkpoints, checkpoint_key
+from features import (
+    CI_ALPHA, DIMENSION_KEYWORDS, FEATURE_STORE_DIR, MIN_NEIGHBOURHOOD_REVIEWS, N_BOOTSTRAP,
+    SENTIMENT_CHUNK_SIZE, build_scores_table, hit_column, match_features, merged_keywords,
+    save_feature_store, score_sentiment,
+)
+from instrumentation import Profiler, count, span
+from model import SIMILAR_K, add_similar_neighbourhoods
+
 REVIEWS_URL  = "https://data.insideairbnb.com/spain/catalonia/barcelona/2025-09-14/data/reviews.csv.gz"
 LISTINGS_URL = "https://data.insideairbnb.com/spain/catalonia/barcelona/2025-09-14/data/listings.csv.gz"
+LISTINGS_COLUMNS = ["id", "neighbourhood_cleansed", "latitude", "longitude"]
+REVIEWS_COLUMNS  = ["listing_id", "comments"]
+
+SCORES_PATH = "neighbourhood_scores.csv"
+
+# Top-level spans each stage records, so profiling a span can force the stage
+# that owns it to run instead of loading its checkpoint
+STAGE_SPANS = {
+    "ingest":    ["download"],
+    "merge":     ["merge", "lowercase"],
+    "match":     ["keyword_matching"],
+    "score":     ["sentiment"],
+    "aggregate": ["aggregation", "similar_index"],
+    "export":    ["save"],
+}
 
 
+def stage_of(span_name: str | None) -> str | None:
+    top = (span_name or "").split("/")[0]
+    return next((stage for stage, spans in STAGE_SPANS.items() if top in spans), None)
+
+
+# ── 1. Ingest: download real Barcelona reviews from Inside Airbnb ──────────────
 def download_csv_gz(url, label, **kwargs):
     print(f"Downloading {label}...")
     r = requests.get(url, timeout=120, headers={"User-Agent": "Mozilla/5.0"})
@@ -28,76 +72,169 @@ def download_csv_gz(url, label, **kwargs):
         raise RuntimeError(f"Failed to download {label}: HTTP {r.status_code}")
     return pd.read_csv(io.BytesIO(r.content), compression="gzip", **kwargs)
 
-listings = download_csv_gz(LISTINGS_URL, "listings",
-                           usecols=["id", "neighbourhood_cleansed"])
-listings = listings.rename(columns={"id": "listing_id"})
 
-reviews = download_csv_gz(REVIEWS_URL, "reviews",
-                          usecols=["listing_id", "comments"])
+def ingest_listings(url: str = LISTINGS_URL) -> pd.DataFrame:
+    with span("download") as s:
+        listings = download_csv_gz(url, "listings", usecols=LISTINGS_COLUMNS)
+        s.rows = len(listings)
+    count("listings_downloaded", len(listings))
+    return listings.rename(columns={"id": "listing_id"})
 
-# ── 2. Merge reviews with neighbourhood labels ─────────────────────────────────
-df = reviews.merge(listings, on="listing_id", how="left")
-df = df.dropna(subset=["comments", "neighbourhood_cleansed"])
-df["comments"] = df["comments"].astype(str).str.lower()
-
-# ── 3. Keyword dictionaries per lifestyle dimension ────────────────────────────
-DIMENSION_KEYWORDS = {
-    "Nightlife & Bars":    ["bar", "nightlife", "club", "pub", "party", "drinks", "cocktail", "tapas", "nightout"],
-    "Peaceful & Quiet":    ["quiet", "peaceful", "calm", "relaxing", "tranquil", "silent", "noisy", "loud", "noise"],
-    "Walkability":         ["walk", "walking distance", "stroll", "walkable", "on foot", "nearby", "close to everything"],
-    "Nature & Parks":      ["park", "garden", "nature", "green", "trees", "outdoor", "fresh air", "beach"],
-    "Food & Restaurants":  ["restaurant", "food", "eat", "cafe", "coffee", "market", "cuisine", "bakery", "brunch"],
-    "Safety":              ["safe", "safety", "secure", "dangerous", "unsafe", "sketchy", "feel safe"],
-    "Public Transport":    ["metro", "bus", "transport", "subway", "train", "tram", "transit", "connection"],
-    "Family-Friendly":     ["family", "kids", "children", "stroller", "playground", "child-friendly", "families"],
-}
-
-def score_review_for_dimension(text, keywords):
-    if not any(kw in text for kw in keywords):
-        return None
-    return TextBlob(text).sentiment.polarity
-
-def score_reviews(df):
-    results = []
-    total = len(df)
-    for i, (_, row) in enumerate(df.iterrows()):
-        if i % 5000 == 0:
-            print(f"  Scoring review {i}/{total}...")
-        text = row["comments"]
-        nbhd = row["neighbourhood_cleansed"]
-        for dim, keywords in DIMENSION_KEYWORDS.items():
-            score = score_review_for_dimension(text, keywords)
-            if score is not None:
-                results.append({"neighbourhood": nbhd, "dimension": dim, "polarity": score})
-    return pd.DataFrame(results)
-
-print("Scoring reviews (this takes a few minutes)...")
-scores_long = score_reviews(df)
-
-# ── 4. Aggregate and scale to 0-100 ───────────────────────────────────────────
-agg = (
-    scores_long
-    .groupby(["neighbourhood", "dimension"])["polarity"]
-    .mean()
-    .reset_index()
-)
-agg["score"] = ((agg["polarity"] + 1) / 2 * 100).round(1)
 
-pivot = agg.pivot(index="neighbourhood", columns="dimension", values="score").reset_index()
-pivot.columns.name = None
+def ingest_reviews(url: str = REVIEWS_URL) -> pd.DataFrame:
+    with span("download") as s:
+        reviews = download_csv_gz(url, "reviews", usecols=REVIEWS_COLUMNS)
+        s.rows = len(reviews)
+    count("reviews_downloaded", len(reviews))
+    return reviews
 
-review_counts = df.groupby("neighbourhood_cleansed").size().reset_index(name="n_reviews")
-review_counts = review_counts.rename(columns={"neighbourhood_cleansed": "neighbourhood"})
-pivot = pivot.merge(review_counts, on="neighbourhood")
-pivot = pivot[pivot["n_reviews"] >= 100].drop(columns="n_reviews")
 
-for col in DIMENSION_KEYWORDS.keys():
-    if col in pivot.columns:
-        pivot[col] = pivot[col].fillna(pivot[col].median())
-
-print(f"\nDone. {len(pivot)} neighbourhoods scored.")
-print(pivot[["neighbourhood"]].to_string())
-
-# ── 5. Save ───────────────────────────────────────────────────────────────────
-pivot.to_csv("neighbourhood_scores.csv", index=False)
-print("\nSaved: neighbourhood_scores.csv")
+# ── 2. Merge reviews with neighbourhood labels ─────────────────────────────────
+def merge(listings: pd.DataFrame, reviews: pd.DataFrame) -> pd.DataFrame:
+    with span("merge", rows=len(reviews)):
+        df = reviews.merge(listings[["listing_id", "neighbourhood_cleansed"]], on="listing_id", how="left")
+        df = df.dropna(subset=["comments", "neighbourhood_cleansed"])
+    count("reviews_merged", len(df))
+
+    with span("lowercase", rows=len(df)):
+        df["comments"] = df["comments"].astype(str).str.lower()
+    return df.reset_index(drop=True)
+
+
+# ── 3. Match keywords and 4. score sentiment ───────────────────────────────────
+# Keyword hits (features.DIMENSION_KEYWORDS) and per-review sentiment are
+# persisted as the feature store, so features.py can add or re-score a single
+# dimension later without repeating this pipeline.
+def feature_store(df: pd.DataFrame, hits: pd.DataFrame, polarity: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Per-review feature table (features.py layout) from the merge output and the match / score outputs."""
+    store = pd.DataFrame({
+        "neighbourhood": df["neighbourhood_cleansed"].to_numpy(),
+        "comments":      df["comments"].to_numpy(),
+    })
+    for col in hits.columns:
+        store[col] = hits[col].to_numpy()
+    store["polarity"] = polarity["polarity"].to_numpy() if polarity is not None else np.nan
+    return store
+
+
+def match(df: pd.DataFrame, dimension_keywords: dict[str, list[str]] = DIMENSION_KEYWORDS) -> pd.DataFrame:
+    """Keyword-hit flags, one column per dimension, row-aligned with `df`."""
+    print("Matching keywords...")
+    return match_features(df, dimension_keywords)[[hit_column(d) for d in dimension_keywords]]
+
+
+def score(df: pd.DataFrame, hits: pd.DataFrame, dims: list[str], chunk_dir: str | None = None,
+          chunk_size: int = SENTIMENT_CHUNK_SIZE) -> pd.DataFrame:
+    """Review polarity (NaN for reviews without a hit), row-aligned with `df`."""
+    print("Scoring sentiment (this takes a few minutes)...")
+    return score_sentiment(feature_store(df, hits), dims, chunk_dir, chunk_size)[["polarity"]]
+
+
+# ── 5. Aggregate and scale to 0-100 ───────────────────────────────────────────
+def aggregate(store: pd.DataFrame, listings: pd.DataFrame, dims: list[str]) -> pd.DataFrame:
+    """
+    Each cell gets its mean score, a bootstrap confidence interval and the
+    number of matching reviews; neighbourhoods under 100 reviews are dropped.
+    Adds neighbourhood centroids and the similar-areas index.
+    """
+    with span("aggregation", rows=len(store)):
+        pivot = build_scores_table(store, dims)
+
+        # Neighbourhood centroids from listing coordinates (median is robust to
+        # mis-geocoded listings) — used by the proximity-aware ranking
+        centroids = (
+            listings.groupby("neighbourhood_cleansed")[["latitude", "longitude"]]
+            .median()
+            .round(5)
+            .reset_index()
+            .rename(columns={"neighbourhood_cleansed": "neighbourhood", "latitude": "lat", "longitude": "lon"})
+        )
+        pivot = pivot.merge(centroids, on="neighbourhood", how="left")
+    count("neighbourhoods_scored", len(pivot))
+
+    with span("similar_index", rows=len(pivot)):
+        return add_similar_neighbourhoods(pivot)
+
+
+# ── 6. Export ─────────────────────────────────────────────────────────────────
+def export(pivot: pd.DataFrame, store: pd.DataFrame, dimension_keywords: dict[str, list[str]],
+           scores_path: str = SCORES_PATH, store_path: str = FEATURE_STORE_DIR) -> None:
+    with span("save", rows=len(store)):
+        save_feature_store(store, dimension_keywords, store_path)
+    print(f"Saved: {store_path}/")
+
+    with span("save", rows=len(pivot)):
+        pivot.to_csv(scores_path, index=False)
+    print(f"\nSaved: {scores_path}")
+
+
+def run_pipeline(checkpoint_dir: str = CHECKPOINT_DIR,
+                 dimension_keywords: dict[str, list[str]] = DIMENSION_KEYWORDS,
+                 scores_path: str = SCORES_PATH, store_path: str = FEATURE_STORE_DIR,
+                 chunk_size: int = SENTIMENT_CHUNK_SIZE, force: str | None = None) -> pd.DataFrame:
+    """Run every stage, reusing checkpoints except for the `force` stage (a STAGE_SPANS key)."""
+    ck = Checkpoints(checkpoint_dir)
+    # Dimensions added or edited with features.py live in the store's manifest
+    dimension_keywords = merged_keywords(dimension_keywords, store_path)
+    dims = list(dimension_keywords)
+
+    # Every key covers the upstream key plus the stage's own parameters
+    listings_key  = checkpoint_key("ingest_listings", LISTINGS_URL, LISTINGS_COLUMNS)
+    reviews_key   = checkpoint_key("ingest_reviews", REVIEWS_URL, REVIEWS_COLUMNS)
+    merge_key     = checkpoint_key("merge", listings_key, reviews_key)
+    match_key     = checkpoint_key("match", merge_key, dimension_keywords)
+    # Chunk size only shapes the chunk files, so it stays out of the key and a
+    # rerun with another --chunk-size still reuses the finished chunks
+    score_key     = checkpoint_key("score", match_key)
+    aggregate_key = checkpoint_key("aggregate", score_key, listings_key,
+                                   MIN_NEIGHBOURHOOD_REVIEWS, N_BOOTSTRAP, CI_ALPHA, SIMILAR_K)
+
+    # Each stage loads its checkpoint or computes from the stage before it, so
+    # upstream stages (and the downloads) only run when a later one is missing.
+    # Loaders are memoised, as the merge output feeds several stages.
+    cached = functools.cache
+    listings = cached(lambda: ck.get("ingest_listings", listings_key, ingest_listings, force == "ingest"))
+    reviews  = cached(lambda: ck.get("ingest_reviews", reviews_key, ingest_reviews, force == "ingest"))
+    merged   = cached(lambda: ck.get("merge", merge_key, lambda: merge(listings(), reviews()), force == "merge"))
+    matched  = cached(lambda: ck.get("match", match_key, lambda: match(merged(), dimension_keywords),
+                                     force == "match"))
+    # A forced score stage also skips the finished chunks, so every review is rescored
+    chunk_dir = None if force == "score" else ck.chunk_dir("score", score_key)
+    scored   = cached(lambda: ck.get("score", score_key, lambda: score(
+        merged(), matched(), dims, chunk_dir, chunk_size), force == "score"))
+
+    store = feature_store(merged(), matched(), scored())
+    pivot = ck.get("aggregate", aggregate_key, lambda: aggregate(store, listings(), dims), force == "aggregate")
+
+    print(f"\nDone. {len(pivot)} neighbourhoods scored.")
+    print(pivot[["neighbourhood"]].to_string())
+
+    export(pivot, store, dimension_keywords, scores_path, store_path)
+    return pivot
+
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline pipeline: Inside Airbnb reviews -> neighbourhood_scores.csv")
+    parser.add_argument("--checkpoints", default=CHECKPOINT_DIR, help="Stage checkpoint directory")
+    parser.add_argument("--chunk-size", type=positive_int, default=SENTIMENT_CHUNK_SIZE, help="Reviews per sentiment checkpoint")
+    parser.add_argument("--metrics", default="metrics/train.json", help="Stage timing report")
+    parser.add_argument("--profile", help='Span to run under cProfile, or "slowest" (from the previous report)')
+    parser.add_argument("--force", choices=list(STAGE_SPANS), help="Stage to recompute despite its checkpoint")
+    args = parser.parse_args()
+
+    # Stages loaded from checkpoints keep their timings from the previous report
+    profiler = Profiler("train", report_path=args.metrics, profile=args.profile, keep_previous=True).activate()
+    # The profiled span's stage has to actually run, so it bypasses its checkpoint
+    force = args.force or stage_of(profiler.profile)
+    try:
+        run_pipeline(args.checkpoints, chunk_size=args.chunk_size, force=force)
+    finally:
+        # Also on failure, so the report shows how far the run got
+        print(f"Saved: {profiler.write()}")